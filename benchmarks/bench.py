@@ -0,0 +1,251 @@
+"""
+Latency / throughput benchmark for the search and message-handling hot paths.
+
+Builds synthetic catalogs (see synthetic.py), replays a weighted query mix
+through clean_query and search_book, and drives main.handle_message,
+inline_query and handle_callback end to end against a stubbed Bot and a
+stubbed Groq client. Nothing touches the network.
+
+    python -m benchmarks.bench                         # 1k / 10k / 100k books
+    python -m benchmarks.bench --sizes 10000 --save benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json
+
+With --baseline the run exits non-zero when any p95 is more than
+--tolerance slower than the saved one.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from benchmarks.synthetic import make_catalog, make_queries
+
+import main
+from modules import ai_brain, config, search_engine
+
+# --- STUBS ---
+class StubCompletions:
+    """Answers like the real prompt does: SEARCH with the stop words removed"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.latency: await asyncio.sleep(self.latency)
+        text = messages[-1]["content"]
+        core = " ".join(w for w in text.split() if w.lower() not in config.STOP_WORDS)
+        content = json.dumps({"intent": "SEARCH", "content": core or text})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class StubGroq:
+    def __init__(self, latency=0.0):
+        self.chat = SimpleNamespace(completions=StubCompletions(latency))
+
+class StubBot:
+    """Every Bot API call just counts (and optionally waits `latency`)"""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.next_message_id = 1000
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency: await asyncio.sleep(self.latency)
+
+    def __getattr__(self, name):
+        async def api_call(*args, **kwargs):
+            await self._call()
+        return api_call
+
+class StubMessage:
+    def __init__(self, bot, text, chat_id, user_id, message_id=None):
+        bot.next_message_id += 1
+        self.bot = bot
+        self.text = text
+        self.chat_id = chat_id
+        self.message_id = message_id or bot.next_message_id
+        self.chat = SimpleNamespace(id=chat_id, type="private")
+        self.from_user = SimpleNamespace(id=user_id)
+        self.reply_to_message = None
+
+    async def reply_text(self, text, **kwargs):
+        await self.bot._call()
+        return StubMessage(self.bot, text, self.chat_id, 0)
+
+    async def delete(self):
+        await self.bot._call()
+
+class StubCallbackQuery:
+    def __init__(self, bot, data, message, user_id):
+        self.bot = bot
+        self.data = data
+        self.message = message
+        self.from_user = SimpleNamespace(id=user_id)
+
+    async def answer(self, *args, **kwargs): await self.bot._call()
+    async def edit_message_reply_markup(self, *args, **kwargs): await self.bot._call()
+    async def edit_message_text(self, *args, **kwargs): await self.bot._call()
+
+class StubInlineQuery:
+    def __init__(self, bot, query, user_id, offset=""):
+        self.bot = bot
+        self.query = query
+        self.offset = offset
+        self.from_user = SimpleNamespace(id=user_id)
+
+    async def answer(self, *args, **kwargs): await self.bot._call()
+
+def message_update(bot, text, user_id):
+    message = StubMessage(bot, text, chat_id=user_id, user_id=user_id)
+    return SimpleNamespace(effective_user=message.from_user, effective_chat=message.chat, message=message,
+                           callback_query=None, inline_query=None)
+
+# --- MEASUREMENT ---
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    total = sum(samples)
+    return {
+        "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+        "throughput": len(samples) / total if total else 0.0,
+    }
+
+def time_sync(fn, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+async def time_async(fn, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        await fn(item)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+async def run_size(size, query_count, llm_latency, bot_latency):
+    books = make_catalog(size)
+    queries = make_queries(query_count)
+    results = {}
+    search_engine.warm_up()  # the bot does this in the background at startup
+
+    # Catalog build and its resident size
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    search_engine.CATALOG = search_engine.build_index(books)
+    build_seconds = time.perf_counter() - start
+    catalog_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    search_engine.GENERATION += 1
+    search_engine.QUERY_CACHE.clear()
+    results["build"] = {"seconds": build_seconds, "catalog_mb": catalog_mb}
+
+    results["clean_query"] = time_sync(search_engine.clean_query, queries)
+
+    def cold_search(text):
+        search_engine.QUERY_CACHE.clear()
+        search_engine.search_book(text)
+    results["search_cold"] = time_sync(cold_search, queries)
+    results["search_warm"] = time_sync(search_engine.search_book, queries)
+
+    # End to end through the handlers
+    bot = StubBot(bot_latency)
+    context = SimpleNamespace(bot=bot, application=None, args=[])
+    ai_brain.client = StubGroq(llm_latency)
+    ai_brain.ANSWERS.clear()
+    config.INLINE_DEBOUNCE = 0
+
+    async def message(i_text):
+        i, text = i_text
+        update = message_update(bot, text, user_id=10_000 + i % 200)
+        await main.handle_message(update, context)
+    results["handle_message"] = await time_async(message, list(enumerate(queries)))
+
+    async def inline(i_text):
+        i, text = i_text
+        update = SimpleNamespace(inline_query=StubInlineQuery(bot, text, 20_000 + i % 200))
+        await main.inline_query(update, context)
+    results["inline_query"] = await time_async(inline, list(enumerate(queries)))
+
+    # Page through result messages the handlers produced
+    keys = list(main.SEARCH_SESSIONS.keys())
+    async def page(i):
+        chat_id, message_id = keys[i % len(keys)]
+        message = StubMessage(bot, "", chat_id, chat_id, message_id=message_id)
+        query = StubCallbackQuery(bot, f"page_{1 + i % 3}|{queries[i]}", message, chat_id)
+        update = SimpleNamespace(callback_query=query, effective_user=query.from_user)
+        await main.handle_callback(update, context)
+    results["handle_callback"] = await time_async(page, range(len(queries))) if keys else {}
+
+    results["llm_calls"] = ai_brain.client.chat.completions.calls
+    results["bot_calls"] = bot.calls
+    results["peak_rss_mb"] = search_engine.peak_rss_mb()
+    return results
+
+# --- REPORT ---
+LATENCY_METRICS = ["clean_query", "search_cold", "search_warm", "handle_message", "inline_query", "handle_callback"]
+
+def print_report(size, results):
+    build = results["build"]
+    rss = f"{results['peak_rss_mb']:.0f} MB" if results["peak_rss_mb"] is not None else "n/a"
+    print(f"\n📚 {size:,} books — build {build['seconds']:.2f}s, catalog {build['catalog_mb']:.1f} MB, "
+          f"process peak RSS {rss}, LLM calls {results['llm_calls']}")
+    print(f"   {'metric':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}")
+    for name in LATENCY_METRICS:
+        m = results.get(name)
+        if not m: continue
+        print(f"   {name:<16}{m['p50']:>10.3f}{m['p95']:>10.3f}{m['p99']:>10.3f}{m['throughput']:>12.0f}")
+
+def compare(baseline, current, tolerance, floor_ms=0.05):
+    """Returns the p95 regressions of `current` against `baseline`"""
+    regressions = []
+    for size, results in current.items():
+        base = baseline.get(size)
+        if not base: continue
+        for name in LATENCY_METRICS:
+            old, new = base.get(name), results.get(name)
+            if not old or not new: continue
+            if new["p95"] > old["p95"] * (1 + tolerance) and new["p95"] - old["p95"] > floor_ms:
+                regressions.append(f"{size} books / {name}: p95 {old['p95']:.3f} -> {new['p95']:.3f} ms")
+    return regressions
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stubbed Groq call")
+    parser.add_argument("--bot-latency", type=float, default=0.0, help="seconds per stubbed Bot API call")
+    parser.add_argument("--save", help="write the results as a new baseline")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    current = {}
+    for size in args.sizes:
+        current[str(size)] = asyncio.run(run_size(size, args.queries, args.llm_latency, args.bot_latency))
+        print_report(size, current[str(size)])
+
+    if args.save:
+        with open(args.save, "w") as f: json.dump(current, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        if regressions:
+            print("\n❌ Regressions:\n   " + "\n   ".join(regressions))
+            return 1
+        print("\n✅ No p95 regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,78 @@
+"""
+Throughput of main.handle_message under PTB's concurrent update processing.
+
+Feeds the same batch of messages through a SimpleUpdateProcessor at several
+concurrency limits (what ApplicationBuilder.concurrent_updates(N) sets up),
+with the stub Bot and Groq client from bench.py adding network-like latency.
+
+    python -m benchmarks.load
+    python -m benchmarks.load --concurrency 1 8 32 --llm-latency 0.3
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from telegram.ext import SimpleUpdateProcessor
+
+from benchmarks.bench import StubBot, StubGroq, message_update, percentiles
+from benchmarks.synthetic import make_catalog, make_queries
+
+import main
+from modules import ai_brain, search_engine
+
+async def run_level(limit, queries, llm_latency, bot_latency):
+    bot = StubBot(bot_latency)
+    context = SimpleNamespace(bot=bot, application=None, args=[])
+    ai_brain.client = StubGroq(llm_latency)
+    ai_brain.ANSWERS.clear()
+    search_engine.QUERY_CACHE.clear()
+
+    processor = SimpleUpdateProcessor(limit)
+    await processor.initialize()
+    samples = []
+
+    async def handle(i, text):
+        update = message_update(bot, text, user_id=10_000 + i)
+        start = time.perf_counter()
+        await processor.process_update(update, main.handle_message(update, context))
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i, text) for i, text in enumerate(queries)))
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+
+    result = percentiles(samples)
+    result["throughput"] = len(queries) / elapsed
+    result["llm_calls"] = ai_brain.client.chat.completions.calls
+    return result
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="seconds per stubbed Groq call")
+    parser.add_argument("--bot-latency", type=float, default=0.05, help="seconds per stubbed Bot API call")
+    args = parser.parse_args(argv)
+
+    search_engine.CATALOG = search_engine.build_index(make_catalog(args.books))
+    search_engine.GENERATION += 1
+    queries = make_queries(args.messages)
+
+    print(f"📨 {args.messages} messages, {args.books:,} books, Groq {args.llm_latency * 1000:.0f} ms, Bot API {args.bot_latency * 1000:.0f} ms")
+    print(f"   {'concurrency':<12}{'msg/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'LLM calls':>11}")
+    asyncio.run(run_levels(args, queries))
+
+async def run_levels(args, queries):
+    # One loop for every level: ai_brain's semaphore is bound to the first loop that uses it
+    base = None
+    for limit in args.concurrency:
+        r = await run_level(limit, queries, args.llm_latency, args.bot_latency)
+        base = base or r["throughput"]
+        print(f"   {limit:<12}{r['throughput']:>10.1f}{r['p50']:>10.0f}{r['p95']:>10.0f}{r['p99']:>10.0f}{r['llm_calls']:>11}"
+              f"   x{r['throughput'] / base:.1f}")
+
+if __name__ == "__main__":
+    main_cli()
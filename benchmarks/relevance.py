@@ -0,0 +1,149 @@
+"""
+Offline relevance + latency evaluation for search_engine.
+
+Runs the labeled queries in fixtures/queries.json (Bangla, Banglish and
+English, each with the titles a user would want) against the fixed catalog
+in fixtures/catalog.json and reports recall@k, MRR and per-query latency of
+clean_query + search_book (query cache cleared, so every search is cold).
+
+    python -m benchmarks.relevance                 # compare with the saved baseline
+    python -m benchmarks.relevance --save          # accept the current numbers
+    python -m benchmarks.relevance --pad 50000     # latency on a bigger catalog too
+    python -m benchmarks.relevance --latency-ref latency.json --save   # record this machine's latency
+
+Exits non-zero when recall@k or MRR drops compared with the committed
+fixtures/relevance_baseline.json. Latency depends on the machine, so it is
+only gated against a --latency-ref file recorded on the same machine
+(p95 rising past --tolerance fails).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.bench import percentiles
+from benchmarks.synthetic import make_catalog
+
+from modules import search_engine
+from modules.config import KEY_TITLE
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+CATALOG_FILE = os.path.join(FIXTURES, "catalog.json")
+QUERIES_FILE = os.path.join(FIXTURES, "queries.json")
+BASELINE_FILE = os.path.join(FIXTURES, "relevance_baseline.json")
+K_VALUES = (1, 5, 10)
+
+def _load(path):
+    with open(path, encoding="utf-8") as f: return json.load(f)
+
+def use_catalog(books):
+    search_engine.CATALOG = search_engine.build_index(books)
+    search_engine.GENERATION += 1
+    search_engine.QUERY_CACHE.clear()
+
+def timed_search(text):
+    search_engine.QUERY_CACHE.clear()
+    start = time.perf_counter()
+    search_engine.clean_query(text)
+    titles = [book[KEY_TITLE] for book in search_engine.search_book(text)]
+    return titles, time.perf_counter() - start
+
+def score(ranked, expected):
+    """recall@k for each k, and the reciprocal rank of the first relevant title"""
+    wanted = set(expected)
+    recall = {k: len(wanted & set(ranked[:k])) / min(len(wanted), k) for k in K_VALUES}
+    rr = next((1 / rank for rank, title in enumerate(ranked, 1) if title in wanted), 0.0)
+    return recall, rr
+
+def evaluate(queries):
+    per_query = []
+    samples = []
+    for q in queries:
+        ranked, seconds = timed_search(q["query"])
+        recall, rr = score(ranked, q["expected"])
+        samples.append(seconds)
+        per_query.append({"query": q["query"], "lang": q["lang"], "rr": rr, "recall": recall, "top": ranked[:3], "ms": seconds * 1000})
+
+    summary = {f"recall@{k}": sum(p["recall"][k] for p in per_query) / len(per_query) for k in K_VALUES}
+    summary["mrr"] = sum(p["rr"] for p in per_query) / len(per_query)
+    for lang in sorted({p["lang"] for p in per_query}):
+        group = [p for p in per_query if p["lang"] == lang]
+        summary[f"mrr_{lang}"] = sum(p["rr"] for p in group) / len(group)
+    summary["latency"] = percentiles(samples)
+    return summary, per_query
+
+def latency_only(queries, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        for q in queries: samples.append(timed_search(q["query"])[1])
+    return percentiles(samples)
+
+def compare(baseline, current, quality_drop, tolerance, floor_ms):
+    failures = []
+    for name, old in baseline.items():
+        if name.startswith("latency"):
+            new = current.get(name)
+            if new and new["p95"] > old["p95"] * (1 + tolerance) and new["p95"] - old["p95"] > floor_ms:
+                failures.append(f"{name} p95 {old['p95']:.3f} -> {new['p95']:.3f} ms")
+        elif name in current and current[name] < old - quality_drop:
+            failures.append(f"{name} {old:.3f} -> {current[name]:.3f}")
+    return failures
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="recall / MRR baseline")
+    parser.add_argument("--latency-ref", help="latency reference from this machine (written with --save)")
+    parser.add_argument("--pad", type=int, default=0, help="also time the queries with this many synthetic books added")
+    parser.add_argument("--quality-drop", type=float, default=0.005, help="allowed drop in recall / MRR")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p95 latency rise (0.5 = 50%%)")
+    parser.add_argument("--floor-ms", type=float, default=0.2, help="ignore latency changes smaller than this")
+    parser.add_argument("--slowest", type=int, default=5, help="how many of the slowest queries to list")
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every query, not just the misses")
+    args = parser.parse_args(argv)
+
+    books = _load(CATALOG_FILE)
+    queries = _load(QUERIES_FILE)
+    use_catalog(books)
+    # Warm up imports and lazily built structures before timing
+    for q in queries: timed_search(q["query"])
+    summary, per_query = evaluate(queries)
+    if args.pad:
+        use_catalog(books + make_catalog(args.pad))
+        summary[f"latency_pad{args.pad}"] = latency_only(queries)
+
+    print(f"🔎 {len(queries)} labeled queries, {len(books)} books")
+    for p in per_query:
+        if args.verbose or p["rr"] < 1:
+            print(f"   {'✅' if p['rr'] == 1 else '⚠️' if p['rr'] else '❌'} [{p['lang']}] {p['query']!r}: "
+                  f"RR {p['rr']:.2f}, R@5 {p['recall'][5]:.2f}, {p['ms']:.3f} ms -> {p['top']}")
+    if args.slowest and not args.verbose:
+        print("\n   Slowest: " + " • ".join(f"{p['query']!r} {p['ms']:.3f} ms" for p in sorted(per_query, key=lambda p: -p["ms"])[:args.slowest]))
+    quality = {k: v for k, v in summary.items() if not k.startswith("latency")}
+    latency = {k: v for k, v in summary.items() if k.startswith("latency")}
+    print("\n   " + " • ".join(f"{k}: {v:.3f}" for k, v in quality.items()))
+    for name, lat in latency.items():
+        print(f"   {name}: p50 {lat['p50']:.3f} ms, p95 {lat['p95']:.3f} ms, p99 {lat['p99']:.3f} ms")
+
+    if args.save:
+        with open(args.baseline, "w") as f: json.dump(quality, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        if args.latency_ref:
+            with open(args.latency_ref, "w") as f: json.dump(latency, f, indent=2)
+            print(f"💾 Latency reference saved to {args.latency_ref}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline yet; run with --save to record one.")
+        return 0
+    failures = compare(_load(args.baseline), quality, args.quality_drop, args.tolerance, args.floor_ms)
+    if args.latency_ref and os.path.exists(args.latency_ref):
+        failures += compare(_load(args.latency_ref), latency, args.quality_drop, args.tolerance, args.floor_ms)
+    if failures:
+        print("\n❌ Worse than the baseline:\n   " + "\n   ".join(failures))
+        return 1
+    print("\n✅ Quality and latency within the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
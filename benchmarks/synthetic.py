@@ -0,0 +1,48 @@
+import random
+
+# --- SYNTHETIC LIBRARY ---
+# Titles are built from the words real users search for (Banglish, English
+# and Bangla), with the noise the real feed has: ".pdf" suffixes, volume
+# numbers, suffixed Bangla forms and repeated titles.
+EN_WORDS = [
+    "sahih", "bukhari", "muslim", "sharif", "hadith", "quran", "tafsir", "ibn", "kathir",
+    "history", "islam", "prayer", "namaz", "roza", "prophet", "life", "biography",
+    "women", "paradise", "hell", "rules", "dream", "iman", "fiqh", "seerah", "aqeedah",
+    "sunnah", "tirmidhi", "abu", "dawud", "jalalain", "riyadus", "salihin", "masala",
+    "jannat", "jahannam", "nabi", "rasul", "jiboni", "itihas", "shikkha", "dua", "zikr",
+]
+BN_WORDS = [
+    "বুখারী", "শরীফ", "হাদিস", "কুরআন", "তাফসীর", "নামাজ", "রোজা", "নবী", "জীবনী",
+    "ইসলামের", "ইতিহাস", "জান্নাত", "জাহান্নাম", "ঈমান", "ফিকহ", "সীরাত", "আকীদা",
+    "সুন্নাহ", "মাসআলা", "নারী", "স্বপ্ন", "দোয়া", "শিক্ষা", "মুসলিম", "রাসূলের",
+]
+
+# (query, weight): popular titles dominate, with typos, Bangla and chit-chat mixed in
+QUERY_MIX = [
+    ("Bukhari sharif pdf dao", 12), ("bukhari", 10), ("quran tafsir", 8), ("namaz shikkha", 8),
+    ("বুখারী শরীফ", 6), ("নামাজ শিক্ষা বই", 6), ("history of islam", 5), ("hadith", 5),
+    ("tafsir ibn kathir", 4), ("life of prophet", 4), ("ইসলামের ইতিহাস", 4), ("bukhary", 3),
+    ("namajer boi", 3), ("riyadus salihin", 3), ("women paradise", 2), ("xyz unknown book", 2),
+    ("salam", 3), ("Who is Imam Bukhari?", 2), ("সীরাত জীবনী", 2), ("dua zikr", 2),
+]
+
+def make_catalog(n, seed=7):
+    rnd = random.Random(seed)
+    vocab = EN_WORDS + BN_WORDS
+    books = []
+    for i in range(n):
+        words = rnd.sample(vocab, rnd.randint(1, 5))
+        if rnd.random() < 0.3: words.append(f"vol {rnd.randint(1, 12)}")
+        title = " ".join(words)
+        if rnd.random() < 0.2: title += ".pdf"
+        books.append({"title": title, "link": f"https://t.me/SobBoiErPdf/{i}", "image": ""})
+    # Re-uploads: the same title twice with another link
+    for i in range(n // 50):
+        books.append(dict(books[rnd.randrange(n)], link=f"https://t.me/SobBoiErPdf/re{i}"))
+    return books
+
+def make_queries(count, seed=11):
+    rnd = random.Random(seed)
+    texts = [q for q, _ in QUERY_MIX]
+    weights = [w for _, w in QUERY_MIX]
+    return rnd.choices(texts, weights=weights, k=count)
@@ -1,66 +1,182 @@
-import logging
-import threading
 import time
-import requests
+BOOT_START = time.perf_counter()  # startup timing includes the imports below
+import logging
+import signal
 import asyncio
-import re
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from uuid import uuid4
+import json
+import httpx
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
-from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, CallbackQueryHandler, CommandHandler, InlineQueryHandler, filters
+from telegram.request import HTTPXRequest
+from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, CallbackQueryHandler, CommandHandler, InlineQueryHandler, ChatMemberHandler, filters
 
 # IMPORT MODULES
-from modules import config, admin_police, search_engine, stats, ai_brain
+from modules import config, admin_police, search_engine, stats, ai_brain, broadcaster, metrics
+from modules.cache import TTLCache
+from modules.rate_limit import UserLimiter
 
-# --- GLOBAL MEMORY ---
-USER_SEARCHES = {} 
+# --- STARTUP TIMING ---
+# Seconds per startup phase, logged once polling is up and again when the
+# background loading has finished.
+STARTUP = {"imports": time.perf_counter() - BOOT_START}
 
-# --- SERVER & KEEP ALIVE (For Render) ---
-class SimpleHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.wfile.write(b"Bot Active")
+def startup_phase(name, since):
+    STARTUP[name] = time.perf_counter() - since
+    return time.perf_counter()
 
-def start_server(): 
-    HTTPServer(("0.0.0.0", 8080), SimpleHandler).serve_forever()
+def log_startup(title):
+    print(f"⏱ {title}: " + " • ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in STARTUP.items()))
 
-def keep_alive():
-    while True:
-        time.sleep(600) # Ping every 10 minutes
-        try: requests.get(config.RENDER_URL)
-        except: pass
+# --- GLOBAL MEMORY ---
+# Pagination sessions: (chat_id, message_id) -> (index generation, book ids).
+# Only compact id arrays are kept, capped by count, age and total ids held.
+SEARCH_SESSIONS = TTLCache(
+    config.SESSION_MAX, config.SESSION_TTL,
+    max_weight=config.SESSION_MAX_IDS, weigher=lambda session: len(session[1])
+)
+metrics.register_cache("sessions", SEARCH_SESSIONS)
+
+# Per-user token buckets: a flood from one account costs one LLM call and
+# search per token, not per message
+MESSAGE_LIMIT = UserLimiter(config.MESSAGE_RATE, config.MESSAGE_BURST)
+INLINE_LIMIT = UserLimiter(config.INLINE_RATE, config.INLINE_BURST)
+
+# --- HEALTH SERVER & KEEP ALIVE (For Render) ---
+# A small asyncio HTTP server on the bot's own event loop: no extra threads,
+# and a slow or idle client only holds its own connection, never the server.
+HEALTH_READ_TIMEOUT = 5     # seconds a client gets to send its request head
+WEBHOOK_MAX_BODY = 1 << 20  # an update is a few KB; anything near this is not Telegram
+HEALTH_SERVER = None
+WEBHOOK_APP = None          # set in webhook mode: POSTs to /WEBHOOK_PATH feed its update queue
+PING_CLIENT = None          # pooled httpx client for the keep-alive ping
+
+def health():
+    """(status code, body) for /healthz"""
+    ok = metrics.LOOP_LAG < config.HEALTH_MAX_LOOP_LAG
+    return (200 if ok else 503), {
+        "status": "ok" if ok else "lagging",
+        "index_generation": search_engine.GENERATION,
+        "books": search_engine.count_books(),
+        "loop_lag_seconds": round(metrics.LOOP_LAG, 4),
+    }
+
+def route(path):
+    """(status code, body, content type) for a GET on `path`"""
+    path = path.split("?")[0]
+    if path == "/metrics":
+        return 200, metrics.render(), "text/plain; version=0.0.4"
+    if path == "/healthz":
+        code, body = health()
+        return code, json.dumps(body), "application/json"
+    return 200, "Bot Active", "text/plain"
+
+async def receive_update(reader, headers):
+    """Webhook POST: checks the secret, reads the body, queues the update"""
+    if WEBHOOK_APP is None: return 404, "Not Found", "text/plain"
+    if headers.get("x-telegram-bot-api-secret-token") != config.WEBHOOK_SECRET:
+        return 403, "Forbidden", "text/plain"
+    length = int(headers.get("content-length") or 0)
+    if not 0 < length <= WEBHOOK_MAX_BODY: return 413, "Payload Too Large", "text/plain"
+    body = await asyncio.wait_for(reader.readexactly(length), HEALTH_READ_TIMEOUT)
+    try: update = Update.de_json(json.loads(body), WEBHOOK_APP.bot)
+    except Exception: return 400, "Bad Request", "text/plain"
+    await WEBHOOK_APP.update_queue.put(update)
+    return 200, "OK", "text/plain"
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+async def serve_http(reader, writer):
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEALTH_READ_TIMEOUT)
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        method = parts[0] if parts else ""
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if value: headers[name.strip().lower()] = value.strip()
+
+        if len(parts) >= 2 and method == "POST" and parts[1] == f"/{config.WEBHOOK_PATH}":
+            code, body, content_type = await receive_update(reader, headers)
+        elif len(parts) >= 2 and method in ("GET", "HEAD"):
+            code, body, content_type = route(parts[1])
+        else:
+            code, body, content_type = 405, "Method Not Allowed", "text/plain"
+        data = body.encode()
+        reason = REASONS.get(code, "")
+        writer.write(
+            f"HTTP/1.1 {code} {reason}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+            + (data if method != "HEAD" else b"")
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def start_health_server():
+    global HEALTH_SERVER
+    HEALTH_SERVER = await asyncio.start_server(serve_http, "0.0.0.0", config.PORT)
+    print(f"🩺 Health server on port {config.PORT}")
+
+async def keep_alive(context: ContextTypes.DEFAULT_TYPE):
+    """Pings the public URL so Render does not put the service to sleep"""
+    global PING_CLIENT
+    # Built on the first ping: creating the SSL context costs ~0.2s of startup
+    if PING_CLIENT is None: PING_CLIENT = httpx.AsyncClient(timeout=30)
+    try: await PING_CLIENT.get(config.RENDER_URL)
+    except Exception: pass
+
+class TimedRequest(HTTPXRequest):
+    """Bot API requests, timed per method (sendMessage, answerInlineQuery, ...)"""
+    async def do_request(self, url, method, *args, **kwargs):
+        with metrics.timed("telegram_api_seconds", method=url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
 
 # --- HELPERS ---
-def escape_markdown(text):
-    """Escapes special characters for Telegram MarkdownV2"""
-    if not text: return ""
-    return re.sub(r"([_*\[\]()~`>#+\-=|{}.!])", r"\\\1", text)
-
-def get_pagination_keyboard(results, page, total_pages):
-    kb = []
+def page_callback(page, search_text):
+    """
+    callback_data for a page button. It carries the search text (cut to
+    Telegram's 64-byte limit) so an expired session can be rebuilt.
+    """
+    data = f"page_{page}|{search_text}"
+    return data.encode()[:64].decode("utf-8", "ignore")
+
+# Rendered pages: popular searches (and paging back and forth) reuse the
+# finished markup. The key holds everything the markup is built from.
+PAGE_CACHE = TTLCache(config.PAGE_CACHE_SIZE, config.SEARCH_CACHE_TTL)
+metrics.register_cache("pages", PAGE_CACHE)
+
+def get_pagination_keyboard(book_ids, page, search_text):
+    total_pages = (len(book_ids) + 4) // 5
     start = page * 5
     end = start + 5
-    current_books = results[start:end]
-    
-    # Book Buttons
-    for book in current_books:
-        title = book.get(config.KEY_TITLE, "Book")
-        # Truncate long titles
-        if len(title) > 30: title = title[:28] + ".."
-        kb.append([InlineKeyboardButton(f"📖 {title}", url=book.get(config.KEY_LINK, "#"))])
+    generation = search_engine.GENERATION
+    catalog = search_engine.CATALOG
+    key = (generation, tuple(book_ids[start:end]), page, total_pages, page_callback(0, search_text))
+    markup = PAGE_CACHE.get(key)
+    if markup is not None: return markup
+
+    # Book Buttons (labels are truncated at catalog build)
+    kb = [
+        [InlineKeyboardButton(f"📖 {catalog.label(book_id)}", url=catalog.link(book_id))]
+        for book_id in book_ids[start:end] if book_id < len(catalog)
+    ]
     
     # Navigation Buttons
     nav = []
     if page > 0: 
-        nav.append(InlineKeyboardButton("⬅️ Back", callback_data=f"page_{page-1}"))
+        nav.append(InlineKeyboardButton("⬅️ Back", callback_data=page_callback(page-1, search_text)))
     
     nav.append(InlineKeyboardButton(f"📄 {page+1}/{total_pages}", callback_data="ignore"))
     
     if page < total_pages - 1: 
-        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{page+1}"))
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=page_callback(page+1, search_text)))
     
     kb.append(nav)
-    return InlineKeyboardMarkup(kb)
+    markup = InlineKeyboardMarkup(kb)
+    PAGE_CACHE.set(key, markup)
+    return markup
 
 # --- HANDLERS ---
 
@@ -80,7 +196,7 @@ async def refresh_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != config.ADMIN_ID: return
     
     await update.message.reply_text("🔄 **Updating Database...**")
-    if search_engine.refresh_database():
+    if await search_engine.refresh_database_async():
         await update.message.reply_text(f"✅ **Update Complete!**\nTotal Books: {search_engine.count_books()}")
     else:
         await update.message.reply_text("❌ **Update Failed.** Check server logs.")
@@ -93,12 +209,17 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats.log_user(user.id)
     if await admin_police.check_and_moderate(update, context): return 
     if not update.message or not update.message.text: return
+    if user.id != config.ADMIN_ID and not MESSAGE_LIMIT.allow(user.id):
+        metrics.inc("rate_limited_total", handler="message")
+        if MESSAGE_LIMIT.should_warn(user.id):
+            await update.message.reply_text("⏳ **Slow down a little!** Try again in a few seconds.", parse_mode="Markdown")
+        return
 
     user_text = update.message.text
     
     # --- PHASE 1: AI BRAIN ANALYSIS ---
     # The AI decides if this is a SEARCH, a CHAT, or IGNORE
-    decision = ai_brain.analyze_and_reply(user_text)
+    decision = await ai_brain.analyze_and_reply(user_text)
     
     intent = decision.get("type", "SEARCH")
     content = decision.get("data", user_text)
@@ -115,22 +236,27 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # CASE C: SEARCH (e.g. "Give me Bukhari PDF")
+    if intent == "SEARCH" and not search_engine.GENERATION:
+        # Nothing loaded yet (first seconds after a cold start)
+        await update.message.reply_text("📚 **The library is still loading.** Please try again in a moment.", parse_mode="Markdown")
+        return
+
     if intent == "SEARCH":
         # Log the search term for analytics
         stats.log_search(content) 
 
         # Search using the cleaned keyword from AI
-        matches = search_engine.search_book(content)
+        generation = search_engine.GENERATION
+        matches = search_engine.search_ids(content)
 
         # 1. Matches Found
         if matches:
-            USER_SEARCHES[user.id] = matches
-            total_pages = (len(matches) + 4) // 5
-            await update.message.reply_text(
+            sent = await update.message.reply_text(
                 f"🔍 **Found {len(matches)} books for '{content}':**", 
-                reply_markup=get_pagination_keyboard(matches, 0, total_pages), 
+                reply_markup=get_pagination_keyboard(matches, 0, content), 
                 parse_mode="Markdown"
             )
+            SEARCH_SESSIONS.set((sent.chat_id, sent.message_id), (generation, matches))
         
         # 2. No Matches Found
         else:
@@ -163,47 +289,85 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # HANDLE PAGINATION
-    if "page_" in data:
-        user_id = update.effective_user.id
-        if user_id not in USER_SEARCHES:
-            await query.edit_message_text("⚠️ **Session Expired.** Please search again.")
-            return
+    if data.startswith("page_") and query.message:
+        page, _, search_text = data[len("page_"):].partition("|")
+        key = (query.message.chat_id, query.message.message_id)
+        session = SEARCH_SESSIONS.get(key)
+
+        # Evicted, or the catalog changed since: re-run the search carried by the button
+        if session is None or session[0] != search_engine.GENERATION:
+            generation = search_engine.GENERATION
+            matches = search_engine.search_ids(search_text) if search_text else None
+            if not matches:
+                await query.edit_message_text("⚠️ **Session Expired.** Please search again.")
+                return
+            session = (generation, matches)
+            SEARCH_SESSIONS.set(key, session)
         
-        new_page = int(data.split("_")[1])
-        matches = USER_SEARCHES[user_id]
+        matches = session[1]
         total_pages = (len(matches) + 4) // 5
+        new_page = min(int(page), total_pages - 1)
         
         try:
             await query.edit_message_reply_markup(
-                reply_markup=get_pagination_keyboard(matches, new_page, total_pages)
+                reply_markup=get_pagination_keyboard(matches, new_page, search_text)
             )
         except: pass
 
-async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handles Inline Mode (@BotName keyword)"""
-    query = update.inline_query.query
-    if not query or len(query) < 2: return
-    
-    results = search_engine.search_book(query)[:10]
-    articles = []
-    
-    for book in results:
-        raw_title = book.get(config.KEY_TITLE, "Book")
-        link = book.get(config.KEY_LINK, "#")
-        safe_title = escape_markdown(raw_title)
-
-        articles.append(InlineQueryResultArticle(
-            id=str(uuid4()),
-            title=raw_title,
+# Newest inline query per user, for debouncing keystrokes
+INLINE_LATEST = {}
+
+# Inline result per book, built on first use and shared by every query that
+# returns the book (PTB objects are immutable, so reuse is safe)
+ARTICLE_CACHE = TTLCache(config.ARTICLE_CACHE_SIZE, config.SEARCH_CACHE_TTL)
+metrics.register_cache("articles", ARTICLE_CACHE)
+
+def inline_article(catalog, generation, book_id):
+    key = (generation, book_id)
+    article = ARTICLE_CACHE.get(key)
+    if article is None:
+        article = InlineQueryResultArticle(
+            id=str(book_id),
+            title=catalog.title(book_id) or "Book",
             description="Click to send PDF",
             input_message_content=InputTextMessageContent(
-                message_text=f"📖 *{safe_title}*\n\n⬇️ [Download PDF]({link})", 
+                message_text=f"📖 *{catalog.escaped_title(book_id)}*\n\n⬇️ [Download PDF]({catalog.link(book_id)})", 
                 parse_mode="MarkdownV2",
                 disable_web_page_preview=False
             )
-        ))
+        )
+        ARTICLE_CACHE.set(key, article)
+    return article
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles Inline Mode (@BotName keyword)"""
+    inline = update.inline_query
+    query = inline.query
+    if not query or len(query) < 2 or not search_engine.GENERATION: return
+    try: offset = int(inline.offset or 0)
+    except ValueError: offset = 0
+
+    # Debounce: a keystroke followed by another within INLINE_DEBOUNCE is dropped
+    if not offset:
+        user_id = inline.from_user.id
+        seq = INLINE_LATEST.get(user_id, 0) + 1
+        INLINE_LATEST[user_id] = seq
+        await asyncio.sleep(config.INLINE_DEBOUNCE)
+        if INLINE_LATEST.get(user_id) != seq: return
+        del INLINE_LATEST[user_id]
+    if not INLINE_LIMIT.allow(inline.from_user.id):
+        metrics.inc("rate_limited_total", handler="inline")
+        return
+
+    generation = search_engine.GENERATION
+    catalog = search_engine.CATALOG
+    book_ids = search_engine.search_inline(query)
+    page = book_ids[offset:offset + config.INLINE_PAGE_SIZE]
+    articles = [inline_article(catalog, generation, book_id) for book_id in page if book_id < len(catalog)]
     
-    await update.inline_query.answer(articles, cache_time=10)
+    end = offset + config.INLINE_PAGE_SIZE
+    next_offset = str(end) if end < len(book_ids) else ""
+    await inline.answer(articles, cache_time=config.INLINE_CACHE_TIME, next_offset=next_offset)
 
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sends a message or photo to ALL users"""
@@ -224,36 +388,83 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Usage: `/broadcast Message` OR Reply to a photo with `/broadcast`")
         return
 
-    users = stats.get_all_users()
-    await update.message.reply_text(f"📢 Broadcasting to {len(users)} users...")
-    
-    count = 0
-    for uid in users:
-        try:
-            if is_photo:
-                await context.bot.send_photo(chat_id=uid, photo=photo_id, caption=msg_text, parse_mode="Markdown")
-            else:
-                await context.bot.send_message(chat_id=uid, text=f"📢 **Announcement:**\n\n{msg_text}", parse_mode="Markdown")
-            count += 1
-            await asyncio.sleep(0.05) # Prevent flood limits
-        except: pass
-    await update.message.reply_text(f"✅ Done. Sent to {count} users.")
+    total = broadcaster.start(context.application, update.effective_chat.id, msg_text, photo_id if is_photo else None)
+    if total is None:
+        await update.message.reply_text("⚠️ A broadcast is already running.")
+        return
+    await update.message.reply_text(f"📢 Broadcasting to {total} users in the background...")
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id == config.ADMIN_ID:
-        await update.message.reply_text(stats.get_stats(), parse_mode="Markdown")
+        report = "\n\n".join([stats.get_stats(), search_engine.cache_report(), ai_brain.get_report()])
+        await update.message.reply_text(report, parse_mode="Markdown")
 
 # --- AUTOMATION JOBS ---
 async def auto_update_db(context: ContextTypes.DEFAULT_TYPE):
-    search_engine.refresh_database()
+    await search_engine.refresh_database_async()
+
+async def flush_stats(context: ContextTypes.DEFAULT_TYPE):
+    await stats.flush_async()
+    await asyncio.to_thread(ai_brain.save_cache)
+
+async def load_in_background():
+    """
+    Everything the first answers need, loaded while polling already runs:
+    the catalog snapshot, stats, the LLM cache, the Groq client and numpy,
+    then the catalog download (retried until it works when there was no
+    snapshot, otherwise a normal refresh).
+    """
+    t = time.perf_counter()
+    has_snapshot = await asyncio.to_thread(search_engine.load_snapshot)
+    t = startup_phase("catalog snapshot", t)
+    # Local files and imports first: none of them should wait on GitHub
+    await asyncio.to_thread(stats.load)
+    t = startup_phase("stats", t)
+    await asyncio.to_thread(ai_brain.load_cache)
+    t = startup_phase("llm cache", t)
+    await asyncio.to_thread(ai_brain.get_client)
+    t = startup_phase("groq client", t)
+    await asyncio.to_thread(search_engine.warm_up)
+    t = startup_phase("numpy", t)
+    if not has_snapshot:
+        # Nothing to answer from until this succeeds, so don't wait for the
+        # regular DB_REFRESH_INTERVAL job: retry with backoff instead
+        delay = config.DB_RETRY_MIN
+        while not await search_engine.refresh_database_async():
+            print(f"⚠️ No catalog yet, retrying the download in {delay}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.DB_RETRY_MAX)
+        startup_phase("catalog download", t)
+    STARTUP["total"] = time.perf_counter() - BOOT_START
+    log_startup("Startup (background loading done)")
+    if has_snapshot: await search_engine.refresh_database_async()
+
+async def on_startup(app):
+    t = time.perf_counter()
+    await start_health_server()
+    # Pick up a broadcast that was cut off by a restart
+    broadcaster.resume(app)
+    loop = asyncio.get_running_loop()
+    loop.create_task(metrics.watch_loop_lag())
+    loop.create_task(load_in_background())
+    startup_phase("post_init", t)
+    STARTUP["ready"] = time.perf_counter() - BOOT_START
+    log_startup("Startup (answering updates)")
+
+async def on_shutdown(app):
+    if HEALTH_SERVER: HEALTH_SERVER.close()
+    if PING_CLIENT: await PING_CLIENT.aclose()
+    stats.flush()
+    ai_brain.save_cache()
 
 async def send_random_book(context: ContextTypes.DEFAULT_TYPE):
-    book = search_engine.get_random_book()
-    if not book: return
+    catalog = search_engine.CATALOG
+    book_id = catalog.random_id()
+    if book_id is None: return
     
-    title = escape_markdown(book.get(config.KEY_TITLE, "Book"))
-    link = book.get(config.KEY_LINK, "#")
-    image = book.get(config.KEY_IMAGE) # Image Support
+    title = catalog.escaped_title(book_id)
+    link = catalog.link(book_id)
+    image = catalog.image(book_id) # Image Support
 
     caption = f"✨ **Random Pick**\n\n📖 *{title}*\n\n🔗 [Read Now]({link})"
 
@@ -264,19 +475,46 @@ async def send_random_book(context: ContextTypes.DEFAULT_TYPE):
             await context.bot.send_message(chat_id=config.GROUP_ID, text=caption, parse_mode="MarkdownV2")
     except: pass
 
+async def run_webhook(app):
+    """
+    Webhook mode: Telegram POSTs updates to the health server's port, so one
+    port serves /healthz, /metrics and the bot. Runs until SIGINT / SIGTERM.
+    """
+    global WEBHOOK_APP
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): loop.add_signal_handler(sig, stop.set)
+
+    async with app:  # initialize() / shutdown()
+        WEBHOOK_APP = app
+        await on_startup(app)  # post_init only runs under run_polling / run_webhook
+        await app.bot.set_webhook(
+            url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=config.CONCURRENT_UPDATES,
+        )
+        await app.start()
+        print(f"🚀 AI Library Bot is Fully Live (webhook, {config.CONCURRENT_UPDATES} concurrent updates)...")
+        await stop.wait()
+        await app.stop()
+        await on_shutdown(app)
+
 # --- MAIN EXECUTION ---
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     
-    # Load Data Immediately
-    search_engine.refresh_database()
-    
-    # Start Keep-Alive Server
-    threading.Thread(target=start_server, daemon=True).start()
-    threading.Thread(target=keep_alive, daemon=True).start()
-    
+    # The catalog is not loaded here: polling starts first and
+    # load_in_background() (from on_startup) fills it in meanwhile.
     if config.BOT_TOKEN:
-        app = ApplicationBuilder().token(config.BOT_TOKEN).build()
+        t = time.perf_counter()
+        app = (
+            ApplicationBuilder().token(config.BOT_TOKEN)
+            .request(TimedRequest())  # getUpdates long-polls keep their own, untimed request
+            .post_init(on_startup).post_shutdown(on_shutdown)
+            .concurrent_updates(config.CONCURRENT_UPDATES)  # one slow Groq call no longer holds up the queue
+            .build()
+        )
         
         # Commands
         app.add_handler(CommandHandler("start", start_command))
@@ -287,7 +525,8 @@ if __name__ == '__main__':
         # Message Handlers
         app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
         app.add_handler(CallbackQueryHandler(handle_callback))
-        app.add_handler(InlineQueryHandler(inline_query))
+        app.add_handler(InlineQueryHandler(inline_query, block=False))  # debounce sleep must not hold up other updates
+        app.add_handler(ChatMemberHandler(admin_police.on_chat_member_update, ChatMemberHandler.ANY_CHAT_MEMBER))
         
         # Automation Jobs
         if app.job_queue:
@@ -295,8 +534,16 @@ if __name__ == '__main__':
             app.job_queue.run_repeating(send_random_book, interval=config.RANDOM_BOOK_INTERVAL, first=10)
             # Update DB every 30 mins
             app.job_queue.run_repeating(auto_update_db, interval=config.DB_REFRESH_INTERVAL, first=1800)
+            # Ping the public URL every 10 minutes (Render sleeps idle services)
+            app.job_queue.run_repeating(keep_alive, interval=config.KEEP_ALIVE_INTERVAL, first=config.KEEP_ALIVE_INTERVAL)
+            # Write buffered user/search stats to disk every minute
+            app.job_queue.run_repeating(flush_stats, interval=config.STATS_FLUSH_INTERVAL, first=config.STATS_FLUSH_INTERVAL)
+        startup_phase("app build", t)
         
-        print("🚀 AI Library Bot is Fully Live...")
-        app.run_polling()
+        if config.WEBHOOK_URL:
+            asyncio.run(run_webhook(app))
+        else:
+            print("🚀 AI Library Bot is Fully Live...")
+            app.run_polling(allowed_updates=Update.ALL_TYPES)  # includes chat_member (admin roster changes)
     else:
         print("Error: BOT_TOKEN is missing in Environment Variables.")
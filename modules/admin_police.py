@@ -1,36 +1,165 @@
 import re
+import time
+import asyncio
 import unicodedata
-from telegram import Update, ChatPermissions
+from telegram import Update, ChatPermissions, ChatMember
 from telegram.ext import ContextTypes
 import datetime
-from modules.config import BAD_WORDS
+from modules import config, metrics
 
 LINK_PATTERN = r"(t\.me\/|telegram\.me\/)"
 
+# Letters of either script; a bad word only matches as a whole word. (\b is
+# not usable for Bangla: vowel signs like "ি" are not \w, so "\bমাগি\b" can
+# never match at the end of a word.)
+WORD_CHARS = r"\w\u0980-\u09FF"
+
 def normalize_text(text):
+    """Lowercases and strips accents from Latin letters, keeping Bangla intact"""
     if not text: return ""
-    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8').lower()
+    out = []
+    base_is_ascii = False
+    for ch in unicodedata.normalize('NFKD', text):
+        if unicodedata.combining(ch):
+            # Accent on a Latin letter ("bítcoin") goes; Bangla vowel signs stay
+            if not base_is_ascii: out.append(ch)
+            continue
+        base_is_ascii = ch.isascii()
+        out.append(ch)
+    return unicodedata.normalize('NFC', "".join(out)).lower()
 
-async def check_and_moderate(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.message.text: return False
-    clean_text = normalize_text(update.message.text)
-    should_ban = False
+# --- MATCHER ---
+# All bad words are folded into one regex shaped like a trie ("scam|sex" ->
+# "s(?:cam|ex)"), merged with the link pattern. The regex engine walks the
+# trie once per position, so the cost per message does not grow with the
+# length of BAD_WORDS. It is rebuilt only when the list changes.
+def _trie_pattern(words):
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w: node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node):
+        alts = []
+        for ch, child in sorted(node.items()):
+            if not ch: continue
+            alts.append((r"\s+" if ch == " " else re.escape(ch)) + walk(child))
+        if not alts: return ""
+        pattern = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return walk(trie)
+
+def build_matcher(words):
+    normalized = {normalize_text(w).strip() for w in words}
+    normalized.discard("")
+    parts = [LINK_PATTERN]
+    if normalized:
+        parts.insert(0, rf"(?<![{WORD_CHARS}]){_trie_pattern(normalized)}(?![{WORD_CHARS}])")
+    return re.compile("|".join(parts))
+
+_MATCHER = build_matcher(config.BAD_WORDS)
+_MATCHER_SOURCE = (id(config.BAD_WORDS), len(config.BAD_WORDS))
+
+def set_bad_words(words):
+    """Replaces the bad word list and recompiles the matcher"""
+    global _MATCHER, _MATCHER_SOURCE
+    config.BAD_WORDS = list(words)
+    _MATCHER = build_matcher(config.BAD_WORDS)
+    _MATCHER_SOURCE = (id(config.BAD_WORDS), len(config.BAD_WORDS))
+
+def is_violation(text):
+    # Cheap staleness check in case config.BAD_WORDS was swapped or appended to
+    if _MATCHER_SOURCE != (id(config.BAD_WORDS), len(config.BAD_WORDS)):
+        set_bad_words(config.BAD_WORDS)
+    return _MATCHER.search(normalize_text(text)) is not None
+
+# --- ADMIN ROSTER CACHE ---
+# One get_chat_administrators call per chat per ADMIN_CACHE_TTL instead of a
+# get_chat_member call for every flagged message. Dropped early when a
+# chat-member update shows someone gaining or losing admin rights.
+ADMIN_CACHE = {}    # chat_id -> (expires_at, frozenset of admin user ids)
+_ADMIN_LOCKS = {}   # chat_id -> asyncio.Lock, so a raid triggers one fetch, not N
 
-    for word in BAD_WORDS:
-        if re.search(r'\b' + re.escape(word) + r'\b', clean_text):
-            should_ban = True; break
+async def get_admin_ids(bot, chat_id):
+    entry = ADMIN_CACHE.get(chat_id)
+    if entry and entry[0] > time.monotonic(): return entry[1]
+    async with _ADMIN_LOCKS.setdefault(chat_id, asyncio.Lock()):
+        entry = ADMIN_CACHE.get(chat_id)
+        if entry and entry[0] > time.monotonic(): return entry[1]
+        admins = await bot.get_chat_administrators(chat_id)
+        ids = frozenset(m.user.id for m in admins)
+        ADMIN_CACHE[chat_id] = (time.monotonic() + config.ADMIN_CACHE_TTL, ids)
+        return ids
 
-    if re.search(LINK_PATTERN, clean_text): should_ban = True
+async def on_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    change = update.chat_member or update.my_chat_member
+    if not change: return
+    admin_states = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+    if (change.old_chat_member.status in admin_states) != (change.new_chat_member.status in admin_states):
+        ADMIN_CACHE.pop(change.chat.id, None)
+
+# --- BATCHED DELETES ---
+# Flagged messages are collected per chat and removed with one
+# delete_messages call (up to 100 ids) shortly after the first one arrives.
+DELETE_BATCH_DELAY = 0.5
+DELETE_BATCH_SIZE = 100
+PENDING_DELETES = {}   # chat_id -> [message_id, ...]
+_DELETE_TASKS = {}     # chat_id -> flush task
+
+async def _flush_deletes(bot, chat_id, delay):
+    if delay: await asyncio.sleep(delay)
+    _DELETE_TASKS.pop(chat_id, None)
+    ids = PENDING_DELETES.pop(chat_id, [])
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        try: await bot.delete_messages(chat_id, ids[i:i + DELETE_BATCH_SIZE])
+        except Exception as e: print(f"Delete error: {e}")
+
+def queue_delete(bot, chat_id, message_id):
+    pending = PENDING_DELETES.setdefault(chat_id, [])
+    pending.append(message_id)
+    if len(pending) >= DELETE_BATCH_SIZE:
+        task = _DELETE_TASKS.pop(chat_id, None)
+        if task: task.cancel()
+        asyncio.get_running_loop().create_task(_flush_deletes(bot, chat_id, 0))
+    elif chat_id not in _DELETE_TASKS:
+        _DELETE_TASKS[chat_id] = asyncio.get_running_loop().create_task(_flush_deletes(bot, chat_id, DELETE_BATCH_DELAY))
+
+# --- REPEAT OFFENDERS ---
+# (chat_id, user_id) -> restriction end (unix time). A flood from one account
+# gets one restrict_chat_member call; the rest of its messages are only deleted.
+RESTRICTED = {}
+
+def _prune_restricted():
+    now = time.time()
+    for key in [k for k, until in RESTRICTED.items() if until <= now]: del RESTRICTED[key]
+
+async def check_and_moderate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    with metrics.timed("moderation_seconds"): return await _moderate(update, context)
+
+async def _moderate(update, context):
+    if not update.message or not update.message.text: return False
+    should_ban = is_violation(update.message.text)
 
     if should_ban:
+        chat_id = update.message.chat_id
+        user = update.message.from_user
+        queue_delete(context.bot, chat_id, update.message.message_id)
+        # Private chats have nobody to restrict; the message is still answered
+        if update.message.chat.type == "private": return False
         try:
-            await update.message.delete()
-            user = update.message.from_user
-            chat_member = await context.bot.get_chat_member(update.message.chat_id, user.id)
-            if chat_member.status not in ["administrator", "creator"]:
-                perms = ChatPermissions(can_send_messages=False)
-                until = datetime.datetime.now() + datetime.timedelta(hours=24)
-                await context.bot.restrict_chat_member(update.message.chat_id, user.id, perms, until_date=until)
-            return True
-        except: pass
-    return False
\ No newline at end of file
+            key = (chat_id, user.id)
+            if RESTRICTED.get(key, 0) > time.time(): return True
+            if user.id in await get_admin_ids(context.bot, chat_id): return True
+            if RESTRICTED.get(key, 0) > time.time(): return True  # claimed while we waited
+
+            until = datetime.datetime.now() + datetime.timedelta(hours=24)
+            RESTRICTED[key] = until.timestamp()  # claimed before awaiting, so parallel handlers skip it
+            if len(RESTRICTED) > 10000: _prune_restricted()
+            perms = ChatPermissions(can_send_messages=False)
+            await context.bot.restrict_chat_member(chat_id, user.id, perms, until_date=until)
+        except Exception as e:
+            print(f"Moderation error: {e}")
+        return True
+    return False
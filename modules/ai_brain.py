@@ -1,21 +1,168 @@
 import os
+import re
+import time
+import asyncio
 import ujson
-from groq import Groq
-from modules import config
+from collections import Counter
+from rapidfuzz import process, fuzz
+from modules import config, search_engine, metrics
+from modules.cache import TTLCache, SingleFlight
 
-# Initialize Groq Client
+# Groq Client (async, so a slow completion never blocks the bot loop).
+# Importing groq takes ~0.2s, so it is built on first use (or by the startup
+# warm-up in a worker thread) instead of at import.
 client = None
-if config.GROQ_API_KEY:
-    try:
-        client = Groq(api_key=config.GROQ_API_KEY)
-    except Exception as e:
-        print(f"Groq Config Error: {e}")
+_CLIENT_TRIED = False
+
+def get_client():
+    global client, _CLIENT_TRIED
+    if client is None and not _CLIENT_TRIED and config.GROQ_API_KEY:
+        _CLIENT_TRIED = True
+        try:
+            from groq import AsyncGroq
+            client = AsyncGroq(api_key=config.GROQ_API_KEY, max_retries=0)
+        except Exception as e:
+            print(f"Groq Config Error: {e}")
+    return client
+
+# At most LLM_CONCURRENCY completions in flight; the rest wait (inside the timeout)
+LLM_SLOTS = asyncio.Semaphore(config.LLM_CONCURRENCY)
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open every call goes
+    straight to the fallback; after `cooldown` seconds one trial call is let
+    through and its result closes or re-opens the circuit.
+    """
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self):
+        if self.opened_at is None: return True
+        if self.trial_running or time.monotonic() - self.opened_at < self.cooldown: return False
+        self.trial_running = True
+        return True
+
+    def record(self, ok):
+        self.trial_running = False
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+        else:
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                if self.opened_at is None: print("⚠️ Groq circuit opened, using offline logic.")
+                self.opened_at = time.monotonic()
+
+BREAKER = CircuitBreaker(config.LLM_BREAKER_THRESHOLD, config.LLM_BREAKER_COOLDOWN)
 
 # --- OFFLINE BACKUP (Safety Net) ---
 OFFLINE_GREETINGS = {
     "hi", "hello", "salam", "assalamu", "alaikum", "hey", "bot", "kemon", "acho"
 }
 
+# --- LOCAL FAST PATH ---
+# Messages that are obviously a greeting or obviously a book title are decided
+# here in microseconds; only the uncertain rest is sent to the model.
+QUESTION_WORDS = {
+    "who", "what", "why", "how", "when", "where", "which", "meaning", "explain",
+    "ke", "keno", "kivabe", "kothay", "kobe", "mane", "ortho",
+    "কে", "কেন", "কিভাবে", "কোথায়", "কবে", "মানে", "অর্থ"
+}
+LOCAL_SEARCH_MAX_WORDS = 4
+ROUTES = Counter()  # local_search / local_chat / cache / llm / coalesced / offline
+
+def _routed(route, decision):
+    ROUTES[route] += 1
+    metrics.inc("intents_total", intent=decision["type"], route=route)
+    return decision
+
+def classify_locally(user_text):
+    """Returns a decision when the intent is obvious, otherwise None"""
+    raw_words = re.findall(r"[\w\u0980-\u09FF]+", user_text.lower())
+    if not raw_words: return None
+
+    # CHAT: nothing but greeting / small-talk words ("salam", "hi bot", "kemon acho")
+    if all(w in OFFLINE_GREETINGS or w in search_engine.CHAT_PHRASES for w in raw_words):
+        return fallback_logic(user_text) if any(w in OFFLINE_GREETINGS for w in raw_words) else None
+
+    if "?" in user_text or any(w in QUESTION_WORDS for w in raw_words): return None
+    words = search_engine.clean_query(user_text)
+    if not words or search_engine.is_conversational(words): return None
+
+    # SEARCH: the message is a catalog title, or a short run of title words
+    if search_engine.is_exact_title(words):
+        return {"type": "SEARCH", "data": user_text.strip()}
+    if len(raw_words) <= LOCAL_SEARCH_MAX_WORDS and search_engine.in_vocabulary(words):
+        return {"type": "SEARCH", "data": user_text.strip()}
+    return None
+
+def get_report():
+    total = sum(ROUTES.values())
+    if not total: return "🧠 **Intent Routing:** no messages yet"
+    parts = " • ".join(f"{name}: `{ROUTES[name]}` ({ROUTES[name] / total:.0%})" for name in ("local_search", "local_chat", "cache", "llm", "coalesced", "offline"))
+    return (
+        f"🧠 **Intent Routing:**\n   {parts}\n"
+        + ANSWERS.report("LLM Cache")
+        + f"\n   Near-duplicate Hits: `{ANSWER_STATS['near_hits']}` • "
+        f"LLM Time Saved: `{ANSWER_STATS['saved_seconds']:.1f}s`"
+    )
+
+# --- ANSWER CACHE ---
+# Groq results keyed on the normalized message, so "Bukhari sharif pdf dao"
+# and "bukhari sharif er pdf" cost one completion between them. A miss can
+# still hit a near-duplicate key. Entries survive restarts via save_cache().
+ANSWERS = TTLCache(config.LLM_CACHE_SIZE, config.LLM_CACHE_TTL)
+ANSWER_STATS = {"near_hits": 0, "saved_seconds": 0.0}
+_CACHE_LOADED = False  # save_cache() must never overwrite the file before it was read
+metrics.register_cache("llm", ANSWERS)
+
+# Concurrent identical (normalized) messages share one Groq call
+IN_FLIGHT = SingleFlight()
+
+def cache_key(user_text):
+    # clean_query without the digit stripping: "vol 2" and "vol 3" must differ
+    words = re.findall(r"[\w\u0980-\u09FF]+", user_text.lower().replace("_", " "))
+    return " ".join(search_engine.get_root_word(w) for w in words if w not in config.STOP_WORDS)
+
+def cached_answer(key):
+    answer = ANSWERS.get(key)
+    if answer is None and config.LLM_CACHE_SIMILARITY:
+        # A near-duplicate only stands in for a SEARCH with the same numbers:
+        # "vol 2" is not "vol 3", and a chat reply about "sadr" does not
+        # answer a question about "sabr" however close the spelling.
+        digits = re.findall(r"\d+", key)
+        near = process.extract(key, ANSWERS.keys(), scorer=fuzz.token_sort_ratio, score_cutoff=config.LLM_CACHE_SIMILARITY, limit=None)
+        for other, _, _ in near:
+            if re.findall(r"\d+", other) != digits: continue
+            candidate = ANSWERS.get(other)
+            if candidate is not None and candidate["type"] == "SEARCH":
+                answer = candidate
+                ANSWER_STATS["near_hits"] += 1
+                break
+    if answer is not None: ANSWER_STATS["saved_seconds"] += answer["latency"]
+    return answer
+
+def load_cache():
+    global _CACHE_LOADED
+    try:
+        with open(config.LLM_CACHE_FILE, 'r') as f: ANSWERS.load(ujson.load(f))
+    except FileNotFoundError: pass
+    except Exception as e: print(f"LLM Cache Error: {e}")
+    _CACHE_LOADED = True
+
+def save_cache():
+    if not _CACHE_LOADED: return
+    try:
+        tmp = f"{config.LLM_CACHE_FILE}.tmp"
+        with open(tmp, 'w') as f: ujson.dump(ANSWERS.dump(), f, ensure_ascii=False)
+        os.replace(tmp, config.LLM_CACHE_FILE)
+    except Exception as e: print(f"LLM Cache Error: {e}")
+
 def fallback_logic(user_text):
     """Used if AI fails or Internet is down"""
     text_lower = user_text.lower()
@@ -29,56 +176,86 @@ def fallback_logic(user_text):
     # Default assumption: It's a search
     return {"type": "SEARCH", "data": user_text}
 
-def analyze_and_reply(user_text):
-    """
-    The Master Brain (Powered by Groq/Llama-3)
-    """
-    # 1. Safety Check
-    if not client:
-        return fallback_logic(user_text)
-
-    try:
-        # 2. THE LIBRARIAN PROMPT
-        # We teach the AI to understand Bangla/English requests and extract the core title.
-        system_instruction = (
-            "You are a smart Library Assistant for an Islamic PDF Bot. "
-            "Your job is to classify the user's message into one of three intents.\n\n"
-            
-            "OUTPUT FORMAT: strictly valid JSON with keys 'intent' and 'content'.\n\n"
-            
-            "INTENT RULES:\n"
-            "1. 'SEARCH': User wants a book, pdf, or topic. (e.g., 'Give me Bukhari', 'Iman books', 'Namazer boi')\n"
-            "   -> CONTENT: Extract ONLY the core book name or topic. Remove words like 'pdf', 'file', 'boi', 'dao', 'plz', 'amake', 'chai'.\n"
-            "   -> Example: 'Amake Bukhari Sharif er pdf dao' -> content: 'Bukhari Sharif'\n"
-            "   -> Example: 'History of Islam' -> content: 'History of Islam'\n\n"
-            
-            "2. 'CHAT': User is greeting or asking a general question. (e.g., 'Hi', 'Kemon acho', 'Who is Allah?', 'Meaning of Sabr')\n"
-            "   -> CONTENT: Write a short, helpful, polite answer (max 40 words).\n\n"
-            
-            "3. 'IGNORE': User is spamming or sending nonsense.\n"
-            "   -> CONTENT: Leave empty.\n"
-        )
+# THE LIBRARIAN PROMPT
+# We teach the AI to understand Bangla/English requests and extract the core title.
+SYSTEM_INSTRUCTION = (
+    "You are a smart Library Assistant for an Islamic PDF Bot. "
+    "Your job is to classify the user's message into one of three intents.\n\n"
+    
+    "OUTPUT FORMAT: strictly valid JSON with keys 'intent' and 'content'.\n\n"
+    
+    "INTENT RULES:\n"
+    "1. 'SEARCH': User wants a book, pdf, or topic. (e.g., 'Give me Bukhari', 'Iman books', 'Namazer boi')\n"
+    "   -> CONTENT: Extract ONLY the core book name or topic. Remove words like 'pdf', 'file', 'boi', 'dao', 'plz', 'amake', 'chai'.\n"
+    "   -> Example: 'Amake Bukhari Sharif er pdf dao' -> content: 'Bukhari Sharif'\n"
+    "   -> Example: 'History of Islam' -> content: 'History of Islam'\n\n"
+    
+    "2. 'CHAT': User is greeting or asking a general question. (e.g., 'Hi', 'Kemon acho', 'Who is Allah?', 'Meaning of Sabr')\n"
+    "   -> CONTENT: Write a short, helpful, polite answer (max 40 words).\n\n"
+    
+    "3. 'IGNORE': User is spamming or sending nonsense.\n"
+    "   -> CONTENT: Leave empty.\n"
+)
 
-        completion = client.chat.completions.create(
+async def _ask_groq(user_text):
+    async with LLM_SLOTS:
+        completion = await get_client().chat.completions.create(
             model="llama3-8b-8192",
             messages=[
-                {"role": "system", "content": system_instruction},
+                {"role": "system", "content": SYSTEM_INSTRUCTION},
                 {"role": "user", "content": user_text}
             ],
             temperature=0.3, # Low temperature = More precise/less creative
             max_tokens=150,
             response_format={"type": "json_object"}
         )
-        
-        # Parse Response
-        response_text = completion.choices[0].message.content
-        result = ujson.loads(response_text)
-        
-        return {
-            "type": result.get("intent", "SEARCH").upper(),
-            "data": result.get("content", "")
-        }
+    
+    # Parse Response
+    response_text = completion.choices[0].message.content
+    result = ujson.loads(response_text)
+    
+    return {
+        "type": result.get("intent", "SEARCH").upper(),
+        "data": result.get("content", "")
+    }
+
+async def analyze_and_reply(user_text):
+    """
+    The Master Brain (Powered by Groq/Llama-3)
+    """
+    # 1. Obvious cases never reach the model
+    decision = classify_locally(user_text)
+    if decision:
+        return _routed("local_search" if decision["type"] == "SEARCH" else "local_chat", decision)
+
+    # 2. Same (or nearly the same) message answered before
+    key = cache_key(user_text)
+    answer = cached_answer(key) if key else None
+    if answer:
+        return _routed("cache", {"type": answer["type"], "data": answer["data"]})
+
+    # 3. The same message is already being asked: wait for that answer
+    flight_key = key or user_text
+    if flight_key in IN_FLIGHT:
+        return _routed("coalesced", await IN_FLIGHT.do(flight_key, _decide, user_text, key))
+    return await IN_FLIGHT.do(flight_key, _decide, user_text, key)
 
+async def _decide(user_text, key):
+    # 4. Safety Check (no key, or Groq has been failing: don't wait on it)
+    if not get_client() or not BREAKER.allow():
+        return _routed("offline", fallback_logic(user_text))
+
+    # 5. Ask the model, but never for longer than LLM_TIMEOUT
+    start = time.monotonic()
+    try:
+        decision = await asyncio.wait_for(_ask_groq(user_text), config.LLM_TIMEOUT)
+        latency = time.monotonic() - start
+        metrics.observe("llm_seconds", latency, outcome="ok")
+        BREAKER.record(True)
+        if key: ANSWERS.set(key, dict(decision, latency=latency))
+        return _routed("llm", decision)
     except Exception as e:
-        print(f"Groq Brain Error: {e}")
-        return fallback_logic(user_text)
+        print(f"Groq Brain Error: {e!r}")
+        metrics.observe("llm_seconds", time.monotonic() - start, outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+        BREAKER.record(False)
+        return _routed("llm", fallback_logic(user_text))
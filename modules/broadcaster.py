@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import ujson
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+from modules import config, stats
+from modules.rate_limit import TokenBucket
+
+# --- BROADCAST ENGINE ---
+# Runs as a background task so the admin's handler returns immediately.
+# Sends go through one global token bucket (Telegram allows ~30 msg/s overall
+# and we send a single message per chat), with at most BROADCAST_CONCURRENCY
+# requests in flight. Progress is checkpointed after every chunk, so after a
+# restart the job resumes from the last finished chunk instead of starting over.
+# The recipient list is written once per job (BROADCAST_USERS_FILE); the
+# checkpoint itself is only the position and the counters.
+CHUNK_SIZE = 50
+MAX_RETRIES = 3
+REPORT_INTERVAL = 15
+
+CURRENT = None  # the running asyncio.Task, if any
+
+def _seconds(retry_after):
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+def _write_json(path, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f: ujson.dump(obj, f)
+    os.replace(tmp, path)
+
+def _save_users(users):
+    _write_json(config.BROADCAST_USERS_FILE, users)
+
+def _save_state(state):
+    _write_json(config.BROADCAST_FILE, {k: v for k, v in state.items() if k != "users"})
+
+def _load_state():
+    try:
+        with open(config.BROADCAST_FILE, 'r') as f: state = ujson.load(f)
+        if "users" not in state:  # older checkpoints kept the list inline
+            with open(config.BROADCAST_USERS_FILE, 'r') as f: state["users"] = ujson.load(f)
+        return state
+    except FileNotFoundError: return None
+    except Exception as e:
+        print(f"Broadcast Error: {e}")
+        return None
+
+def _clear_state():
+    for path in (config.BROADCAST_FILE, config.BROADCAST_USERS_FILE):
+        try: os.remove(path)
+        except FileNotFoundError: pass
+
+def is_running():
+    return CURRENT is not None and not CURRENT.done()
+
+async def _send_one(bot, state, uid, bucket):
+    """Returns 'sent', 'removed' or 'failed'"""
+    attempts = 0  # network errors only; flood waits are retried until Telegram lets us through
+    while attempts < MAX_RETRIES:
+        await bucket.acquire()
+        try:
+            if state["photo"]:
+                await bot.send_photo(chat_id=uid, photo=state["photo"], caption=state["text"], parse_mode="Markdown")
+            else:
+                await bot.send_message(chat_id=uid, text=f"📢 **Announcement:**\n\n{state['text']}", parse_mode="Markdown")
+            return "sent"
+        except RetryAfter as e:
+            # Flood control applies to the whole bot: hold every sender back
+            bucket.pause(_seconds(e.retry_after))
+        except Forbidden:
+            # Bot blocked or account deactivated: stop messaging this user
+            stats.remove_user(uid)
+            return "removed"
+        except BadRequest as e:
+            if "chat not found" in str(e).lower():
+                stats.remove_user(uid)
+                return "removed"
+            return "failed"
+        except (TimedOut, NetworkError):
+            attempts += 1
+            await asyncio.sleep(1)
+        except Exception as e:
+            print(f"Broadcast Error: {e}")
+            return "failed"
+    return "failed"
+
+def _progress_text(state, started, done_at_start, final=False):
+    total = len(state["users"])
+    done = state["next"]
+    elapsed = max(time.monotonic() - started, 1e-6)
+    rate = (done - done_at_start) / elapsed
+    eta = (total - done) / rate if rate else 0
+    head = "✅ **Broadcast Done.**" if final else "📢 **Broadcasting...**"
+    return (
+        f"{head}\n"
+        f"Progress: `{done}/{total}`\n"
+        f"Sent: `{state['sent']}` • Removed: `{state['removed']}` • Failed: `{state['failed']}`\n"
+        f"Speed: `{rate:.1f} msg/s`" + ("" if final else f" • ETA: `{eta:.0f}s`")
+    )
+
+async def _run(bot, state):
+    global CURRENT
+    bucket = TokenBucket(config.BROADCAST_RATE)
+    limit = asyncio.Semaphore(config.BROADCAST_CONCURRENCY)
+    started = time.monotonic()
+    done_at_start = state["next"]
+    last_report = started
+    users = state["users"]
+
+    async def send(uid):
+        async with limit: return await _send_one(bot, state, uid, bucket)
+
+    try:
+        while state["next"] < len(users):
+            chunk = users[state["next"]:state["next"] + CHUNK_SIZE]
+            for outcome in await asyncio.gather(*(send(uid) for uid in chunk)):
+                state[outcome] += 1
+            state["next"] += len(chunk)
+            await asyncio.to_thread(_save_state, state)
+
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                last_report = time.monotonic()
+                try: await bot.send_message(chat_id=state["admin_chat"], text=_progress_text(state, started, done_at_start), parse_mode="Markdown")
+                except Exception: pass
+
+        _clear_state()
+        try: await bot.send_message(chat_id=state["admin_chat"], text=_progress_text(state, started, done_at_start, final=True), parse_mode="Markdown")
+        except Exception: pass
+    finally:
+        CURRENT = None
+
+def start(app, admin_chat, text, photo=None):
+    """Starts a new broadcast in the background. Returns the number of recipients, or None if one is already running."""
+    global CURRENT
+    if is_running(): return None
+    state = {
+        "admin_chat": admin_chat, "text": text, "photo": photo,
+        "users": stats.get_all_users(), "next": 0,
+        "sent": 0, "removed": 0, "failed": 0,
+    }
+    _save_users(state["users"])
+    _save_state(state)
+    CURRENT = app.create_task(_run(app.bot, state))
+    return len(state["users"])
+
+def resume(app):
+    """Continues a broadcast interrupted by a restart, if there is one"""
+    global CURRENT
+    state = _load_state()
+    if not state or is_running(): return False
+    print(f"📢 Resuming broadcast at {state['next']}/{len(state['users'])}")
+    CURRENT = app.create_task(_run(app.bot, state))
+    return True
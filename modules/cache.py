@@ -0,0 +1,103 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after `ttl` seconds.
+    With a `weigher`, the summed weight of all entries is also kept under
+    `max_weight` (e.g. total ids held, as a memory cap).
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, max_weight=None, weigher=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, weight)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        self.weight -= self._data.pop(key)[2]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None: self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        weight = self.weigher(value) if self.weigher else 0
+        with self._lock:
+            if key in self._data: self._drop(key)
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, weight)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (self.max_weight is not None and self.weight > self.max_weight and len(self._data) > 1):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def keys(self):
+        with self._lock: return list(self._data)
+
+    def dump(self):
+        """[key, value, seconds_left] for live entries, least recently used first"""
+        now = time.monotonic()
+        with self._lock:
+            return [[k, v, exp - now] for k, (exp, v, _) in self._data.items() if exp > now]
+
+    def load(self, entries):
+        for key, value, seconds_left in entries:
+            if seconds_left > 0: self.set(key, value, seconds_left)
+
+    def __len__(self):
+        return len(self._data)
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self, name):
+        return (
+            f"🗂 **{name}:** `{len(self)}/{self.maxsize}` entries\n"
+            f"   Hits: `{self.hits}` • Misses: `{self.misses}` • "
+            f"Evictions: `{self.evictions}` • Hit Rate: `{self.hit_ratio():.0%}`"
+        )
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation:
+    the first caller starts it, the rest await the same task.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+        self.shared = 0
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn, *args):
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: one cancelled caller must not cancel the work the others wait on
+        return await asyncio.shield(task)
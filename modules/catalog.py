@@ -0,0 +1,185 @@
+import re
+import zlib
+import random
+from bisect import bisect_left
+from array import array
+
+# --- DISPLAY STRINGS ---
+# Worked out once per title at build time, so result pages, inline answers
+# and the random pick only slice them out.
+LABEL_LENGTH = 30
+
+def escape_markdown(text):
+    """Escapes special characters for Telegram MarkdownV2"""
+    if not text: return ""
+    return re.sub(r"([_*\[\]()~`>#+\-=|{}.!])", r"\\\1", text)
+
+def button_label(title):
+    """Result button text: the title, truncated for the keyboard"""
+    title = title or "Book"
+    if len(title) > LABEL_LENGTH: title = title[:LABEL_LENGTH - 2] + ".."
+    # No "📖 " here: one character outside the BMP would make Python store
+    # the whole joined labels column at 4 bytes per character
+    return title
+
+# --- COLUMNAR CATALOG ---
+# The library as a handful of flat columns instead of one dict per book:
+# strings live in one big str per column with an offsets array, and every
+# book's root words are token ids in one shared array. A book is just its
+# integer id (its position in the feed).
+
+class StringColumn:
+    """Many strings stored back to back in one str, sliced out by offset"""
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, strings=()):
+        offsets = array("I", [0])
+        parts = []
+        total = 0
+        for s in strings:
+            parts.append(s)
+            total += len(s)
+            offsets.append(total)
+        self.data = "".join(parts)
+        self.offsets = offsets
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def take(self, ids):
+        data, offsets = self.data, self.offsets
+        return [data[offsets[i]:offsets[i + 1]] for i in ids]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __eq__(self, other):
+        return isinstance(other, StringColumn) and self.data == other.data and self.offsets == other.offsets
+
+def deletion_key(d):
+    return zlib.crc32(d.encode("utf-8"))
+
+class DeleteIndex:
+    """Token ids of the words with deletion `d`: ids[offsets[i]:offsets[i + 1]] where keys[i] == crc32(d)"""
+    __slots__ = ("keys", "offsets", "ids")
+
+    def __init__(self, keys=None, offsets=None, ids=None):
+        self.keys = keys if keys is not None else array("I")
+        self.offsets = offsets if offsets is not None else array("I", [0])
+        self.ids = ids if ids is not None else array("I")
+
+    def get(self, d):
+        key = deletion_key(d)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key: return ()
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        return self.keys, self.offsets, self.ids
+
+    def __setstate__(self, state):
+        self.keys, self.offsets, self.ids = state
+
+class Catalog:
+    """
+    Book id -> title / link / image and the display strings derived from the
+    title (`labels` for result buttons, `escaped` for MarkdownV2), plus the
+    search data derived from the titles: `vocab` (sorted root words, token id = position), each book's
+    token ids as tokens[token_offsets[i]:token_offsets[i + 1]], the inverted
+    index `postings` (token id -> array of book ids), `texts` (normalized
+    title per book, for fuzzy scoring) and the typo index `deletes`.
+    """
+    __slots__ = (
+        "titles", "links", "images", "texts", "labels", "escaped",
+        "vocab", "token_of", "tokens", "token_offsets", "postings", "deletes",
+    )
+
+    def __init__(self, titles=None, links=None, images=None, texts=None, labels=None, escaped=None,
+                 vocab=(), tokens=None, token_offsets=None, postings=(), deletes=None):
+        self.titles = titles or StringColumn()
+        self.links = links or StringColumn()
+        self.images = images or StringColumn()
+        self.texts = texts or StringColumn()
+        self.labels = labels or StringColumn()
+        self.escaped = escaped or StringColumn()
+        self.vocab = list(vocab)
+        self.token_of = {w: t for t, w in enumerate(self.vocab)}
+        self.tokens = tokens if tokens is not None else array("I")
+        self.token_offsets = token_offsets if token_offsets is not None else array("I", [0])
+        self.postings = list(postings)
+        self.deletes = deletes if deletes is not None else DeleteIndex()
+
+    @classmethod
+    def build(cls, rows, book_words):
+        """
+        `rows` are (title, link, image) tuples; `book_words` the root words of
+        each title (same order). Ids are assigned in feed order, so books with
+        the same title are kept apart instead of overwriting each other.
+        """
+        vocab = sorted({w for words in book_words for w in words})
+        token_of = {w: t for t, w in enumerate(vocab)}
+        tokens = array("I")
+        token_offsets = array("I", [0])
+        postings = [array("I") for _ in vocab]
+        for book_id, words in enumerate(book_words):
+            for w in words:
+                t = token_of[w]
+                tokens.append(t)
+                postings[t].append(book_id)
+            token_offsets.append(len(tokens))
+
+        return cls(
+            StringColumn(r[0] for r in rows),
+            StringColumn(r[1] for r in rows),
+            StringColumn(r[2] for r in rows),
+            StringColumn(" ".join(words) for words in book_words),
+            StringColumn(button_label(r[0]) for r in rows),
+            StringColumn(escape_markdown(r[0] or "Book") for r in rows),
+            vocab, tokens, token_offsets, postings,
+        )
+
+    def __len__(self):
+        return len(self.titles)
+
+    def title(self, book_id):
+        return self.titles[book_id]
+
+    def label(self, book_id):
+        return self.labels[book_id]
+
+    def escaped_title(self, book_id):
+        return self.escaped[book_id]
+
+    def link(self, book_id):
+        return self.links[book_id] or "#"
+
+    def image(self, book_id):
+        return self.images[book_id] or None
+
+    def words(self, book_id):
+        return tuple(self.vocab[t] for t in self.tokens[self.token_offsets[book_id]:self.token_offsets[book_id + 1]])
+
+    def word_count(self, book_id):
+        return self.token_offsets[book_id + 1] - self.token_offsets[book_id]
+
+    def books_with(self, word):
+        """Postings of a root word (empty if it is not in any title)"""
+        t = self.token_of.get(word)
+        return self.postings[t] if t is not None else ()
+
+    def random_id(self):
+        return random.randrange(len(self)) if len(self) else None
+
+    def same_books(self, other):
+        return self.titles == other.titles and self.links == other.links and self.images == other.images
+
+    def __getstate__(self):
+        # token_of is rebuilt from vocab on load
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != "token_of"}
+
+    def __setstate__(self, state):
+        for slot, value in state.items(): setattr(self, slot, value)
+        self.token_of = {w: t for t, w in enumerate(self.vocab)}
@@ -1,10 +1,20 @@
 import os
+import hashlib
 
 # --- SECURITY ---
 BOT_TOKEN = os.getenv("BOT_TOKEN") 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") 
 DATA_URL = "https://raw.githubusercontent.com/Meher-Hazan/Darrusunnat-PDF-Library/main/books_data.json"
 RENDER_URL = "https://library-bot-amuk.onrender.com" 
+PORT = int(os.getenv("PORT", 8080))
+
+# --- DEPLOYMENT ---
+# With WEBHOOK_URL set (e.g. RENDER_URL) Telegram pushes updates to
+# WEBHOOK_URL/WEBHOOK_PATH on PORT; otherwise the bot long-polls.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = "telegram"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()[:32]
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 16))  # updates handled at once
 
 # --- ADMIN SETTINGS ---
 ADMIN_ID = 123456789  
@@ -13,6 +23,25 @@ GROUP_ID = -1001234567890
 # TIMERS
 RANDOM_BOOK_INTERVAL = 14400 
 DB_REFRESH_INTERVAL = 1800
+DB_RETRY_MIN = 5               # first wait after a failed startup download (no snapshot)...
+DB_RETRY_MAX = 300             # ...doubling up to this
+DB_REFRESH_TRACE_MEMORY = False  # log the traced parse + build peak (makes a refresh ~5x slower)
+STATS_FLUSH_INTERVAL = 60
+KEEP_ALIVE_INTERVAL = 600
+ADMIN_CACHE_TTL = 600
+HEALTH_MAX_LOOP_LAG = 2        # /healthz turns 503 when the event loop is this many seconds behind
+
+# CACHES
+SEARCH_CACHE_SIZE = 2048
+SEARCH_CACHE_TTL = 900
+INLINE_PAGE_SIZE = 50          # Telegram's maximum per answer
+INLINE_CACHE_TIME = 300        # seconds Telegram may reuse an inline answer
+INLINE_DEBOUNCE = 0.3          # seconds to wait for the next keystroke
+SESSION_TTL = 86400            # pagination buttons keep working for a day
+SESSION_MAX = 20000            # result messages remembered
+SESSION_MAX_IDS = 2_000_000    # book ids held across all sessions (~8 MB)
+PAGE_CACHE_SIZE = 5000         # rendered result-page keyboards
+ARTICLE_CACHE_SIZE = 20000     # inline result articles (one per book)
 
 # JSON KEYS
 KEY_TITLE = "title"
@@ -22,6 +51,29 @@ KEY_IMAGE = "image"
 # --- FILES ---
 STATS_FILE = "stats.json"
 USERS_FILE = "user_database.json"
+SNAPSHOT_FILE = "catalog_snapshot.pkl"
+BROADCAST_FILE = "broadcast_state.json"
+BROADCAST_USERS_FILE = "broadcast_users.json"
+LLM_CACHE_FILE = "llm_cache.json"
+
+# --- AI (GROQ) ---
+LLM_CONCURRENCY = 4          # completions in flight at once
+LLM_TIMEOUT = 6              # seconds before we answer with the offline logic
+LLM_BREAKER_THRESHOLD = 5    # consecutive failures that open the circuit
+LLM_BREAKER_COOLDOWN = 60    # seconds to skip Groq once the circuit is open
+LLM_CACHE_SIZE = 5000        # remembered {intent, content} answers
+LLM_CACHE_TTL = 7 * 86400    # seconds an answer stays valid
+LLM_CACHE_SIMILARITY = 92    # rapidfuzz score for a near-duplicate hit (0 disables)
+
+# --- RATE LIMITS (per user) ---
+MESSAGE_RATE = 0.5           # messages per second a user may send on average...
+MESSAGE_BURST = 5            # ...after a burst of this many
+INLINE_RATE = 2              # inline searches per second (after debouncing)
+INLINE_BURST = 10
+
+# --- BROADCAST ---
+BROADCAST_RATE = 25          # messages per second (Telegram's global limit is ~30)
+BROADCAST_CONCURRENCY = 10   # requests in flight at once
 
 # --- LISTS ---
 SYNONYMS = {
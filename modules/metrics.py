@@ -0,0 +1,140 @@
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# --- IN-PROCESS METRICS ---
+# Counters, gauges and latency histograms kept in plain dicts and rendered in
+# the Prometheus text format on /metrics. Values that already live elsewhere
+# (cache counters, index size) are read at scrape time through collectors
+# instead of being copied on every update.
+
+PREFIX = "librarybot_"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "llm_seconds": "Groq completion latency",
+    "search_seconds": "Catalog search latency",
+    "moderation_seconds": "check_and_moderate latency",
+    "stats_flush_seconds": "Time to write the stats files",
+    "telegram_api_seconds": "Bot API request latency",
+    "refresh_seconds": "Catalog refresh duration",
+    "intents_total": "Messages by decided intent and where the decision came from",
+    "rate_limited_total": "Updates dropped by the per-user rate limit",
+    "cache_hits_total": "Cache hits",
+    "cache_misses_total": "Cache misses",
+    "cache_entries": "Entries currently cached",
+    "index_books": "Books in the catalog",
+    "index_vocabulary": "Distinct root words in the catalog",
+    "index_generation": "Catalog generation (bumped on every swap)",
+    "loop_lag_seconds": "How late the event loop woke up for a timer",
+}
+
+_LOCK = threading.Lock()
+COUNTERS = {}     # (name, labels) -> value
+GAUGES = {}       # (name, labels) -> value
+HISTOGRAMS = {}   # (name, labels) -> [bucket counts..., sum, count]
+COLLECTORS = []   # callables returning [(name, type, labels dict, value), ...]
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _LOCK: COUNTERS[key] = COUNTERS.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    with _LOCK: GAUGES[_key(name, labels)] = value
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _LOCK:
+        hist = HISTOGRAMS.get(key)
+        if hist is None: hist = HISTOGRAMS[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += seconds
+        hist[-1] += 1
+
+@contextmanager
+def timed(name, **labels):
+    """with metrics.timed("search_seconds", kind="inline"): ... (works around awaits too)"""
+    start = time.perf_counter()
+    try: yield
+    finally: observe(name, time.perf_counter() - start, **labels)
+
+def register(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+def register_cache(name, cache):
+    """Exposes a TTLCache's hit / miss / size counters under cache=`name`"""
+    register(lambda: [
+        ("cache_hits_total", "counter", {"cache": name}, cache.hits),
+        ("cache_misses_total", "counter", {"cache": name}, cache.misses),
+        ("cache_entries", "gauge", {"cache": name}, len(cache)),
+    ])
+
+# --- EVENT LOOP LAG ---
+LOOP_LAG = 0.0
+
+async def watch_loop_lag(interval=1.0):
+    """Sleeps `interval` forever and records how late each wake-up was"""
+    global LOOP_LAG
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG = max(0.0, loop.time() - start - interval)
+        set_gauge("loop_lag_seconds", LOOP_LAG)
+
+# --- EXPOSITION ---
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    families = {}   # name -> (type, [lines])
+
+    def family(name, kind):
+        if name not in families: families[name] = (kind, [])
+        return families[name][1]
+
+    with _LOCK:
+        counters = list(COUNTERS.items())
+        gauges = list(GAUGES.items())
+        histograms = [(key, list(hist)) for key, hist in HISTOGRAMS.items()]
+
+    for (name, labels), value in counters:
+        family(name, "counter").append(f"{PREFIX}{name}{_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        family(name, "gauge").append(f"{PREFIX}{name}{_labels(labels)} {value}")
+    for collector in COLLECTORS:
+        try:
+            for name, kind, labels, value in collector():
+                family(name, kind).append(f"{PREFIX}{name}{_labels(sorted(labels.items()))} {value}")
+        except Exception as e: print(f"Metrics collector error: {e}")
+    for (name, labels), hist in histograms:
+        lines = family(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, hist):
+            cumulative += count
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {hist[-2]}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {hist[-1]}")
+
+    out = []
+    for name in sorted(families):
+        kind, lines = families[name]
+        if name in HELP: out.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+        out.append(f"# TYPE {PREFIX}{name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -0,0 +1,69 @@
+import time
+import asyncio
+from modules.cache import TTLCache
+
+class TokenBucket:
+    """Allows `rate` actions per second, with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    async def acquire(self, n=1):
+        while not self.try_acquire(n):
+            await asyncio.sleep((n - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """
+        Drains the bucket so nobody gets a token for `seconds` (flood control).
+        Pauses overlap rather than add up: ten senders told to wait 30s at
+        once still wait 30s.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+class UserLimiter:
+    """
+    One TokenBucket per user. A bucket left alone for capacity / rate seconds
+    is full again, so idle ones are simply forgotten (the TTL) instead of
+    being kept for every user who ever wrote.
+    """
+
+    def __init__(self, rate, capacity, max_users=50000):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = TTLCache(max_users, capacity / rate)
+        self.refused = 0
+
+    def allow(self, user_id):
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+            bucket.warned = False
+        self.buckets.set(user_id, bucket)  # refreshes the idle TTL
+        if bucket.try_acquire():
+            bucket.warned = False
+            return True
+        self.refused += 1
+        return False
+
+    def should_warn(self, user_id):
+        """True once per run of refused messages, so a flood gets one notice"""
+        bucket = self.buckets.get(user_id)
+        if bucket is None or bucket.warned: return False
+        bucket.warned = True
+        return True
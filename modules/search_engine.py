@@ -1,11 +1,27 @@
-import requests
 import re
-import random
-from rapidfuzz import fuzz
-from modules.config import DATA_URL, SYNONYMS, STOP_WORDS, KEY_TITLE
+import os
+import time
+import json
+import codecs
+import pickle
+import asyncio
+import threading
+import tracemalloc
+import heapq
+from bisect import bisect_left
+from array import array
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+from modules.config import DATA_URL, SYNONYMS, STOP_WORDS, KEY_TITLE, KEY_LINK, KEY_IMAGE, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SNAPSHOT_FILE, DB_REFRESH_TRACE_MEMORY
+from modules.cache import TTLCache
+from modules import metrics
+from modules.catalog import Catalog, DeleteIndex, deletion_key
 
-BOOKS_DB = []
-SEARCH_INDEX = {}
+# Results keyed on the cleaned query, so "Bukhari pdf" and "bukhari er boi"
+# share an entry. GENERATION is part of the key and is bumped on every
+# refresh, so a result from an older catalog can never be served.
+QUERY_CACHE = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+GENERATION = 0
 
 CHAT_PHRASES = {
     "hi", "hello", "salam", "assalamu", "alaikum", "kemon", "acho", 
@@ -41,66 +57,433 @@ def is_conversational(words):
     count = sum(1 for w in words if w in CHAT_PHRASES)
     return (count / len(words)) > 0.5
 
+# --- TYPO TOLERANCE (SymSpell-style deletion index) ---
+# Every vocabulary word is stored under all the strings reachable by deleting
+# up to TYPO_MAX_DISTANCE characters from its first TYPO_PREFIX characters.
+# A misspelled token generates its own deletions and looks them up, so the
+# candidates come out of a few binary searches instead of a vocabulary scan.
+# The deletions are kept as sorted crc32 values with the token ids stored
+# behind each one (like Catalog.tokens / token_offsets), not as a dict of
+# strings: ~100k short str keys and their lists cost more than the catalog.
+# A crc32 collision only adds a candidate that Levenshtein then rejects.
+TYPO_MAX_DISTANCE = 2
+TYPO_PREFIX = 5
+TYPO_MIN_LEN = 3
+
+def _deletions(word, max_distance):
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i+1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found |= frontier
+    return found
+
+def build_deletes(vocabulary):
+    # (crc32 << 32 | token id) packs each entry into one int, so a plain sort
+    # groups them by deletion
+    entries = []
+    for t, word in enumerate(vocabulary):
+        if len(word) < TYPO_MIN_LEN: continue
+        entries.extend(deletion_key(d) << 32 | t for d in _deletions(word[:TYPO_PREFIX], TYPO_MAX_DISTANCE))
+    entries.sort()
+
+    hashes = [e >> 32 for e in entries]
+    starts = [i for i in range(len(hashes)) if not i or hashes[i] != hashes[i - 1]]
+    return DeleteIndex(
+        array("I", [hashes[i] for i in starts]),
+        array("I", starts + [len(entries)]),
+        array("I", [e & 0xFFFFFFFF for e in entries]),
+    )
+
+def typo_candidates(token, catalog=None):
+    """Vocabulary words closest to `token` by edit distance (best first)"""
+    catalog = catalog or CATALOG
+    if len(token) < TYPO_MIN_LEN: return []
+    max_distance = 1 if len(token) <= 5 else TYPO_MAX_DISTANCE
+
+    best = {}
+    for d in _deletions(token[:TYPO_PREFIX], max_distance):
+        for t in catalog.deletes.get(d):
+            word = catalog.vocab[t]
+            if word in best: continue
+            dist = Levenshtein.distance(token, word, score_cutoff=max_distance)
+            if dist <= max_distance: best[word] = dist
+
+    # Closest first, then the word that appears in the most titles
+    return sorted(best, key=lambda w: (best[w], -len(catalog.books_with(w))))
+
+def correct_words(words, catalog=None):
+    catalog = catalog or CATALOG
+    corrected = []
+    for w in words:
+        if w not in catalog.token_of:
+            candidates = typo_candidates(w, catalog)
+            if candidates: w = candidates[0]
+        corrected.append(w)
+    return corrected
+
+# --- CATALOG BUILD ---
+def build_catalog(rows, previous=None):
+    """
+    Builds a Catalog from (title, link, image) rows. Titles already
+    tokenized in `previous` reuse its root words, so a refresh only runs
+    clean_query on added/renamed titles.
+    """
+    known = {}
+    if previous is not None:
+        known = {previous.title(i): previous.words(i) for i in range(len(previous))}
+
+    book_words = []
+    for title, _, _ in rows:
+        words = known.get(title)
+        if words is None:
+            words = known[title] = tuple(dict.fromkeys(clean_query(title)))
+        book_words.append(words)
+
+    catalog = Catalog.build(rows, book_words)
+
+    # The typo index only depends on the vocabulary
+    if previous is not None and catalog.vocab == previous.vocab:
+        catalog.deletes = previous.deletes
+    else:
+        catalog.deletes = build_deletes(catalog.vocab)
+    return catalog
+
+def catalog_row(item):
+    image = item.get(KEY_IMAGE)
+    return (
+        str(item.get(KEY_TITLE) or ""),
+        str(item.get(KEY_LINK) or ""),
+        image if isinstance(image, str) else "",
+    )
+
+def build_index(books, previous=None):
+    """Catalog from a list of book dicts (the books_data.json format)"""
+    return build_catalog([catalog_row(b) for b in books], previous)
+
+CATALOG = Catalog()
+
 # --- DATABASE MANAGEMENT ---
+def iter_json_array(chunks):
+    """
+    Yields the items of a top-level JSON array from an iterable of byte
+    chunks, so each book is parsed as it downloads and the full response
+    body is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, opened = "", 0, False
+    for chunk in chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,\ufeff": pos += 1
+            if pos >= len(buf): break
+            if not opened:
+                if buf[pos] != "[": raise ValueError("catalog is not a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buf[pos] == "]": return
+            try: item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError: break  # item continues in the next chunk
+            yield item
+    raise ValueError("catalog JSON ended early")
+
+def peak_rss_mb():
+    """Lifetime peak RSS of the process in MB, or None where there is no `resource` (Windows)"""
+    try: import resource
+    except ImportError: return None
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+HTTP = None            # requests.Session, created by the first refresh (keeps `requests` off the import path)
+HTTP_VALIDATORS = {}   # ETag / Last-Modified of the catalog we currently hold
+REFRESH_LOCK = threading.Lock()
+
 def refresh_database():
-    """Downloads new books from GitHub"""
-    global BOOKS_DB, SEARCH_INDEX
+    """Downloads new books from GitHub (blocking; see refresh_database_async)"""
+    start = time.perf_counter()
+    with REFRESH_LOCK: outcome = _refresh()
+    metrics.observe("refresh_seconds", time.perf_counter() - start, outcome=outcome)
+    return outcome != "failed"
+
+def _refresh():
+    """One refresh attempt: "changed", "unchanged" or "failed" """
+    global CATALOG, GENERATION, HTTP
+    if HTTP is None:
+        import requests
+        HTTP = requests.Session()
     try:
-        # Add a random query param to bypass cache
-        url = f"{DATA_URL}?t={random.randint(1, 10000)}"
-        resp = requests.get(url)
-        
-        if resp.status_code == 200:
-            new_db = resp.json()
-            new_index = {}
-            for book in new_db:
-                raw_title = book.get(KEY_TITLE, "")
-                clean_words = clean_query(raw_title)
-                if clean_words:
-                    new_index[raw_title] = {"words": set(clean_words), "data": book}
-            
-            # Atomic Update (Prevents bot from being empty during update)
-            BOOKS_DB = new_db
-            SEARCH_INDEX = new_index
-            print(f"✅ Database Refreshed: {len(BOOKS_DB)} books.")
-            return True
-        else:
-            print(f"❌ Database update failed: Status {resp.status_code}")
-            return False
+        # Conditional request: an unchanged file costs a 304 and no parsing
+        headers = {}
+        if "etag" in HTTP_VALIDATORS: headers["If-None-Match"] = HTTP_VALIDATORS["etag"]
+        if "last_modified" in HTTP_VALIDATORS: headers["If-Modified-Since"] = HTTP_VALIDATORS["last_modified"]
+        with HTTP.get(DATA_URL, headers=headers, timeout=60, stream=True) as resp:
+            if resp.status_code == 304:
+                print(f"✅ Database unchanged: {len(CATALOG)} books.")
+                return "unchanged"
+            if resp.status_code != 200:
+                print(f"❌ Database update failed: Status {resp.status_code}")
+                return "failed"
+
+            # Parsed while streaming, straight into (title, link, image) rows.
+            # ru_maxrss only tells the process lifetime peak, so the peak of
+            # this parse + build is traced when DB_REFRESH_TRACE_MEMORY asks for it.
+            trace = DB_REFRESH_TRACE_MEMORY and not tracemalloc.is_tracing()
+            if trace: tracemalloc.start()
+            try:
+                rows = [catalog_row(item) for item in iter_json_array(resp.iter_content(64 * 1024)) if isinstance(item, dict)]
+                new_catalog = build_catalog(rows, previous=CATALOG)
+                del rows
+                build_peak = tracemalloc.get_traced_memory()[1] / 1e6 if trace else None
+            finally:
+                if trace: tracemalloc.stop()
+
+        validators = {}
+        if resp.headers.get("ETag"): validators["etag"] = resp.headers["ETag"]
+        if resp.headers.get("Last-Modified"): validators["last_modified"] = resp.headers["Last-Modified"]
+
+        if new_catalog.same_books(CATALOG):
+            HTTP_VALIDATORS.clear(); HTTP_VALIDATORS.update(validators)
+            print(f"✅ Database unchanged: {len(CATALOG)} books.")
+            return "unchanged"
+
+        old_titles = {CATALOG.title(i) for i in range(len(CATALOG))}
+        new_titles = {new_catalog.title(i) for i in range(len(new_catalog))}
+
+        # Atomic Update (Prevents bot from being empty during update).
+        # The catalog is published before the generation, and readers take
+        # GENERATION first: a handler may pair an old generation with the new
+        # catalog (its session is just rebuilt later), never the reverse.
+        CATALOG = new_catalog
+        GENERATION += 1
+        QUERY_CACHE.clear()
+        HTTP_VALIDATORS.clear(); HTTP_VALIDATORS.update(validators)
+        if build_peak is not None: memory = f", parse + build peak {build_peak:.1f} MB"
+        elif peak_rss_mb() is not None: memory = f", process lifetime peak RSS {peak_rss_mb():.0f} MB (not this refresh's peak)"
+        else: memory = ""
+        print(
+            f"✅ Database Refreshed: {len(CATALOG)} books "
+            f"(+{len(new_titles - old_titles)} / -{len(old_titles - new_titles)} titles){memory}."
+        )
+        save_snapshot()
+        return "changed"
     except Exception as e:
         print(f"❌ DB Error: {e}")
+        return "failed"
+
+# --- SNAPSHOT (instant cold start) ---
+# The parsed catalog and the built index are pickled after every refresh that
+# changed something. At boot they are loaded straight back, so the bot can
+# answer before (or without) reaching GitHub. Bump SNAPSHOT_VERSION whenever
+# the Catalog layout changes; older files are then ignored.
+SNAPSHOT_VERSION = 6
+
+def save_snapshot(path=SNAPSHOT_FILE):
+    state = {
+        "version": SNAPSHOT_VERSION,
+        "validators": dict(HTTP_VALIDATORS),
+        "catalog": CATALOG,
+    }
+    try:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f: pickle.dump(state, f, protocol=5)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"⚠️ Snapshot save failed: {e}")
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Restores the last saved catalog. Returns False if there is none usable."""
+    global CATALOG, GENERATION
+    if not os.path.exists(path): return False
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f: state = pickle.load(f)
+        if state.get("version") != SNAPSHOT_VERSION: return False
+        new_catalog = state["catalog"]
+    except Exception as e:
+        print(f"⚠️ Snapshot load failed: {e}")
         return False
 
+    with REFRESH_LOCK:
+        CATALOG = new_catalog
+        GENERATION += 1
+        QUERY_CACHE.clear()
+        HTTP_VALIDATORS.clear(); HTTP_VALIDATORS.update(state["validators"])
+    print(f"✅ Snapshot Loaded: {len(CATALOG)} books in {(time.perf_counter() - start) * 1000:.0f} ms.")
+    return True
+
+async def refresh_database_async():
+    """Runs the refresh in a worker thread so the bot keeps answering meanwhile"""
+    return await asyncio.to_thread(refresh_database)
+
 def count_books():
-    return len(BOOKS_DB)
+    return len(CATALOG)
+
+def search_ids(user_sentence, fuzzy=True):
+    """
+    Exact root-word search, returning book ids (best first) as a shared,
+    read-only array. With `fuzzy`, a query with words no title contains is
+    retried once with them replaced by their closest spelling from the title
+    vocabulary ("bukhary" -> "bukhari"); titles matching every corrected word
+    go before the partial matches of what was typed.
+    """
+    with metrics.timed("search_seconds", kind="message"):
+        query_words = clean_query(user_sentence)
+        if not query_words or is_conversational(query_words): return array("I")
+        return search_words(query_words, fuzzy)
+
+def search_words(query_words, fuzzy=True):
+    key = (GENERATION, tuple(query_words), fuzzy)
+    cached = QUERY_CACHE.get(key)
+    if cached is not None: return cached
+
+    catalog = CATALOG
+    results = rank_books(query_words, catalog)
+    # An unknown word means there is no perfect tier, only partial matches
+    # that lack it ("sahih bukhary" -> every "sahih" title)
+    if fuzzy and not all(w in catalog.token_of for w in query_words):
+        corrected = correct_words(query_words, catalog)
+        if corrected != query_words:
+            fixed = rank_books(corrected, catalog, perfect_only=bool(results))
+            if results and fixed:
+                seen = set(fixed)
+                fixed.extend(i for i in results if i not in seen)
+            results = fixed or results
+
+    QUERY_CACHE.set(key, results)
+    return results
+
+# --- AS-YOU-TYPE (INLINE) SEARCH ---
+INLINE_COMPLETIONS = 3
+
+def complete_prefix(prefix, limit=INLINE_COMPLETIONS):
+    """The `limit` most common title words starting with `prefix`"""
+    catalog = CATALOG
+    vocab = catalog.vocab
+    lo = bisect_left(vocab, prefix)
+    hi = bisect_left(vocab, prefix + "\U0010ffff", lo)
+    top = heapq.nlargest(limit, range(lo, hi), key=lambda t: len(catalog.postings[t]))
+    return [vocab[t] for t in top]
+
+def search_inline(text):
+    """
+    Ranked ids for an inline query. Unless the text ends with a space the
+    last word is still being typed, so titles matching every word with the
+    last one completed ("bukh" -> "bukhari") rank with the exact hits, ahead
+    of titles that only match some of the words.
+    """
+    with metrics.timed("search_seconds", kind="inline"): return _search_inline(text)
+
+def _search_inline(text):
+    query_words = clean_query(text)
+    if not query_words or is_conversational(query_words): return array("I")
+    typing = not text.endswith(" ")
 
-def get_random_book():
-    if not BOOKS_DB: return None
-    return random.choice(BOOKS_DB)
+    key = (GENERATION, "inline", tuple(query_words), typing)
+    cached = QUERY_CACHE.get(key)
+    if cached is not None: return cached
 
-def search_book(user_sentence):
-    query_words = clean_query(user_sentence)
-    if not query_words or is_conversational(query_words): return []
+    results = search_words(query_words, fuzzy=False)
+    if typing:
+        # Full matches of the text as typed and of each completion first,
+        # then the partial matches of the text as typed
+        catalog = CATALOG
+        queries = [query_words] + [query_words[:-1] + [w] for w in complete_prefix(query_words[-1]) if w != query_words[-1]]
+        ranked = array("I")
+        seen = set()
+        for words in queries:
+            for book_id in rank_books(words, catalog, perfect_only=True):
+                if book_id not in seen:
+                    seen.add(book_id)
+                    ranked.append(book_id)
+        ranked.extend(i for i in results if i not in seen)
+        results = ranked
+    if not results: results = search_words(query_words, fuzzy=True)
 
+    QUERY_CACHE.set(key, results)
+    return results
+
+def search_book(user_sentence, fuzzy=True):
+    return [book_dict(i) for i in search_ids(user_sentence, fuzzy)]
+
+def book_dict(book_id, catalog=None):
+    """A book in the books_data.json shape"""
+    catalog = catalog or CATALOG
+    return {KEY_TITLE: catalog.title(book_id), KEY_LINK: catalog.link(book_id), KEY_IMAGE: catalog.image(book_id)}
+
+def in_vocabulary(words):
+    """True if every root word appears in at least one title"""
+    token_of = CATALOG.token_of
+    return bool(words) and all(w in token_of for w in words)
+
+def is_exact_title(words):
+    """True if some title consists of exactly these root words"""
+    catalog = CATALOG
+    query_set = set(words)
+    if not query_set or not all(w in catalog.token_of for w in query_set): return False
+    rarest = min(query_set, key=lambda w: len(catalog.books_with(w)))
+    for book_id in catalog.books_with(rarest):
+        if catalog.word_count(book_id) == len(query_set) and query_set.issuperset(catalog.words(book_id)):
+            return True
+    return False
+
+def cache_report():
+    return QUERY_CACHE.report("Search Cache")
+
+metrics.register_cache("search", QUERY_CACHE)
+metrics.register(lambda: [
+    ("index_books", "gauge", {}, len(CATALOG)),
+    ("index_vocabulary", "gauge", {}, len(CATALOG.vocab)),
+    ("index_generation", "gauge", {}, GENERATION),
+])
+
+# Below this many candidates the thread pool costs more than it saves
+PARALLEL_SCORING_MIN = 2000
+PARTIAL_LIMIT = 20
+
+def warm_up():
+    """Imports what the first search needs (numpy), so no user pays for it"""
+    import numpy  # noqa: F401
+
+def rank_books(query_words, catalog, perfect_only=False):
+    import numpy as np  # deferred for startup time; after the first call this is a dict lookup
     query_set = set(query_words)
-    matches = []
-
-    for raw_title, info in SEARCH_INDEX.items():
-        book_words = info["words"]
-        common = query_set.intersection(book_words)
-        if not common: continue
-
-        coverage = len(common) / len(query_set)
-        if (len(query_set) == 1 and coverage == 1.0) or (len(query_set) > 1 and coverage >= 0.5):
-            fuzz_score = fuzz.partial_ratio(" ".join(query_words), " ".join(book_words))
-            final_score = (coverage * 100) + (fuzz_score * 0.2)
-            matches.append({"book": info["data"], "score": final_score, "coverage": coverage})
-
-    matches.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Tier 1: Perfect Matches
-    perfect = [m["book"] for m in matches if m["coverage"] == 1.0]
-    if perfect: return perfect
-    
-    # Tier 2: Partial Matches
-    return [m["book"] for m in matches[:20]]
\ No newline at end of file
+
+    # Only books sharing at least one root word with the query are touched:
+    # their postings are merged, and the number of query words each book
+    # contains is how often its id shows up.
+    lists = [np.frombuffer(ids, dtype=np.uint32) for ids in map(catalog.books_with, query_set) if len(ids)]
+    if not lists: return array("I")
+    book_ids, common = np.unique(np.concatenate(lists), return_counts=True)
+    common = common.astype(np.float64)
+
+    # Tier 1: Perfect Matches (every query word present). Only the tier that
+    # will actually be returned gets scored.
+    perfect = common == len(query_set)
+    is_perfect = bool(perfect.any())
+    if is_perfect:
+        book_ids = book_ids[perfect]
+        coverage = np.ones(len(book_ids))
+    elif len(query_set) > 1 and not perfect_only:
+        # Tier 2: Partial Matches (at least half the query words)
+        partial = common * 2 >= len(query_set)
+        book_ids = book_ids[partial]
+        coverage = common[partial] / len(query_set)
+    else:
+        return array("I")
+    if not len(book_ids): return array("I")
+
+    choices = catalog.texts.take(book_ids.tolist())
+    fuzz_scores = process.cdist(
+        [" ".join(query_words)], choices, scorer=fuzz.partial_ratio,
+        workers=-1 if len(choices) >= PARALLEL_SCORING_MIN else 1
+    )[0]
+    scores = (coverage * 100) + (fuzz_scores.astype(np.float64) * 0.2)
+
+    if is_perfect:
+        order = np.argsort(-scores, kind="stable")
+    else:
+        order = heapq.nlargest(PARTIAL_LIMIT, range(len(scores)), key=scores.__getitem__)
+    return array("I", book_ids[order].tolist())
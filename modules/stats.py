@@ -1,57 +1,120 @@
-import ujson
-import os
-from modules import config
-
-# Ensure files exist
-if not os.path.exists(config.USERS_FILE):
-    with open(config.USERS_FILE, 'w') as f: ujson.dump([], f)
-
-if not os.path.exists(config.STATS_FILE):
-    with open(config.STATS_FILE, 'w') as f: ujson.dump({"searches": 0, "top_terms": {}}, f)
-
-def log_user(user_id):
-    """Saves User ID instantly to disk"""
-    try:
-        # Load current list
-        with open(config.USERS_FILE, 'r') as f: 
-            users = ujson.load(f)
-        
-        # Only add if new
-        if user_id not in users:
-            users.append(user_id)
-            # Save immediately
-            with open(config.USERS_FILE, 'w') as f: 
-                ujson.dump(users, f)
-    except Exception as e:
-        print(f"Stats Error: {e}")
-
-def get_all_users():
-    """Returns list of all user IDs"""
-    try:
-        with open(config.USERS_FILE, 'r') as f: return ujson.load(f)
-    except: return []
-
-def log_search(term):
-    if len(term) < 3: return
-    try:
-        with open(config.STATS_FILE, 'r') as f: data = ujson.load(f)
-        data["searches"] += 1
-        data["top_terms"][term] = data["top_terms"].get(term, 0) + 1
-        with open(config.STATS_FILE, 'w') as f: ujson.dump(data, f)
-    except: pass
-
-def get_stats():
-    try:
-        with open(config.USERS_FILE, 'r') as f: users = len(ujson.load(f))
-        with open(config.STATS_FILE, 'r') as f: data = ujson.load(f)
-        
-        top = sorted(data["top_terms"].items(), key=lambda x: x[1], reverse=True)[:5]
-        top_str = "\n".join([f"• {k}: {v}" for k,v in top])
-        
-        return (
-            f"📊 **Bot Statistics**\n\n"
-            f"👥 Total Users: `{users}`\n"
-            f"🔎 Total Searches: `{data['searches']}`\n\n"
-            f"🔥 **Top Searches:**\n{top_str}"
-        )
-    except: return "No stats available yet."
\ No newline at end of file
+import ujson
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from modules import config, metrics
+
+# --- IN-MEMORY STATE ---
+# Handlers only touch these structures (O(1), no disk I/O). flush() writes
+# them out in one batch; main.py calls it periodically and on shutdown.
+# The files are read by load() during startup (or by whichever function
+# needs them first), not at import.
+USERS = {}              # user_id -> None (a dict keeps join order and gives O(1) lookups)
+TOP_TERMS = Counter()
+SEARCHES = 0
+_DIRTY = False
+_LOADED = False
+_LOCK = threading.Lock()
+_FLUSH_LOCK = threading.Lock()  # one writer at a time (the flush job and shutdown share the .tmp files)
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r') as f: return ujson.load(f)
+    except FileNotFoundError: return default
+    except Exception as e:
+        print(f"Stats Error: {e}")
+        return default
+
+def load():
+    """Reads the stats files into memory (missing files start empty)"""
+    global SEARCHES, _LOADED
+    users = _read_json(config.USERS_FILE, [])
+    data = _read_json(config.STATS_FILE, {"searches": 0, "top_terms": {}})
+    with _LOCK:
+        if _LOADED: return
+        # Entries logged before the files were read are kept on top
+        USERS.update(dict.fromkeys(users))
+        TOP_TERMS.update(data.get("top_terms", {}))
+        SEARCHES += data.get("searches", 0)
+        _LOADED = True
+
+def _ensure_loaded():
+    if not _LOADED: load()
+
+def _write_json(path, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f: ujson.dump(obj, f)
+    os.replace(tmp, path)
+
+def flush():
+    """Writes pending changes to disk in one go. Safe to call from a worker thread."""
+    _ensure_loaded()  # never overwrite the files with only this session's entries
+    with _FLUSH_LOCK: return _flush()
+
+def _flush():
+    global _DIRTY
+    with _LOCK:
+        if not _DIRTY: return False
+        users = list(USERS)
+        data = {"searches": SEARCHES, "top_terms": dict(TOP_TERMS)}
+        _DIRTY = False
+    try:
+        start = time.perf_counter()
+        _write_json(config.USERS_FILE, users)
+        _write_json(config.STATS_FILE, data)
+        metrics.observe("stats_flush_seconds", time.perf_counter() - start)
+        return True
+    except Exception as e:
+        print(f"Stats Error: {e}")
+        with _LOCK: _DIRTY = True
+        return False
+
+async def flush_async():
+    return await asyncio.to_thread(flush)
+
+def log_user(user_id):
+    """Remembers the user; persisted on the next flush (merged with the files if they are not read yet)"""
+    global _DIRTY
+    if user_id in USERS: return
+    with _LOCK:
+        USERS[user_id] = None
+        _DIRTY = True
+
+def remove_user(user_id):
+    """Forgets a user who blocked the bot or deleted their account"""
+    global _DIRTY
+    _ensure_loaded()
+    with _LOCK:
+        if user_id in USERS:
+            del USERS[user_id]
+            _DIRTY = True
+
+def get_all_users():
+    """Returns list of all user IDs"""
+    _ensure_loaded()
+    with _LOCK: return list(USERS)
+
+def log_search(term):
+    global SEARCHES, _DIRTY
+    if len(term) < 3: return
+    with _LOCK:
+        SEARCHES += 1
+        TOP_TERMS[term] += 1
+        _DIRTY = True
+
+def get_stats():
+    _ensure_loaded()
+    with _LOCK:
+        users = len(USERS)
+        searches = SEARCHES
+        top = TOP_TERMS.most_common(5)
+    top_str = "\n".join([f"• {k}: {v}" for k,v in top])
+
+    return (
+        f"📊 **Bot Statistics**\n\n"
+        f"👥 Total Users: `{users}`\n"
+        f"🔎 Total Searches: `{searches}`\n\n"
+        f"🔥 **Top Searches:**\n{top_str}"
+    )
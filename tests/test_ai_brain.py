@@ -0,0 +1,16 @@
+from modules import ai_brain
+
+def _remember(text, kind, data):
+    ai_brain.ANSWERS.set(ai_brain.cache_key(text), {"type": kind, "data": data, "latency": 1.0})
+
+def test_near_duplicate_needs_the_same_numbers():
+    ai_brain.ANSWERS.clear()
+    _remember("Sahih Bukhari vol 2 er pdf dao", "SEARCH", "Sahih Bukhari vol 2")
+    assert ai_brain.cached_answer(ai_brain.cache_key("Sahih Bukhari vol 3 er pdf dao")) is None
+    assert ai_brain.cached_answer(ai_brain.cache_key("Sahih Bukharii vol 2 er pdf dao"))["data"] == "Sahih Bukhari vol 2"
+
+def test_chat_answers_are_not_reused_for_near_duplicates():
+    ai_brain.ANSWERS.clear()
+    _remember("what is sadr", "CHAT", "Sadr is the chest")
+    assert ai_brain.cached_answer(ai_brain.cache_key("what is sabr")) is None
+    assert ai_brain.cached_answer(ai_brain.cache_key("what is sadr"))["data"] == "Sadr is the chest"
@@ -0,0 +1,78 @@
+import asyncio
+
+from modules import broadcaster
+from modules.rate_limit import TokenBucket
+from telegram.error import RetryAfter, TimedOut
+
+def test_pauses_overlap_instead_of_adding_up():
+    bucket = TokenBucket(25, 25)
+    for _ in range(10): bucket.pause(30)
+    # One 30s wait at 25 tokens/s, not ten of them
+    assert -30 * 25 - 1 <= bucket.tokens <= -30 * 25 + 1
+
+def test_pause_keeps_the_longer_wait():
+    bucket = TokenBucket(10, 10)
+    bucket.pause(60)
+    bucket.pause(5)
+    assert bucket.tokens <= -59 * 10
+
+def test_try_acquire_respects_capacity():
+    bucket = TokenBucket(1, 3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+class FloodBot:
+    """Flood-waits `floods` times, then times out `timeouts` times, then sends"""
+    def __init__(self, floods=0, timeouts=0):
+        self.floods = floods
+        self.timeouts = timeouts
+        self.sent = 0
+
+    async def send_message(self, **kwargs):
+        if self.floods:
+            self.floods -= 1
+            raise RetryAfter(0)
+        if self.timeouts:
+            self.timeouts -= 1
+            raise TimedOut()
+        self.sent += 1
+
+def _send(bot, monkeypatch):
+    async def no_sleep(_): pass
+    monkeypatch.setattr(broadcaster.asyncio, "sleep", no_sleep)
+    state = {"photo": None, "text": "hi"}
+    return asyncio.run(broadcaster._send_one(bot, state, 1, TokenBucket(1000, 1000)))
+
+def test_flood_waits_do_not_use_up_retries(monkeypatch):
+    bot = FloodBot(floods=broadcaster.MAX_RETRIES + 2)
+    assert _send(bot, monkeypatch) == "sent"
+    assert bot.sent == 1
+
+def test_network_errors_are_retried_a_limited_number_of_times(monkeypatch):
+    assert _send(FloodBot(timeouts=broadcaster.MAX_RETRIES), monkeypatch) == "failed"
+    assert _send(FloodBot(timeouts=broadcaster.MAX_RETRIES - 1), monkeypatch) == "sent"
+
+def test_checkpoints_leave_the_recipient_list_alone(monkeypatch, tmp_path):
+    monkeypatch.setattr(broadcaster.config, "BROADCAST_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(broadcaster.config, "BROADCAST_USERS_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(broadcaster.config, "BROADCAST_RATE", 100000)
+    users_writes = []
+    save_users = broadcaster._save_users
+    monkeypatch.setattr(broadcaster, "_save_users", lambda users: users_writes.append(1) or save_users(users))
+
+    state = {"admin_chat": 1, "text": "hi", "photo": None, "users": list(range(120)), "next": 0, "sent": 0, "removed": 0, "failed": 0}
+    broadcaster._save_users(state["users"])
+    broadcaster._save_state(state)
+    assert broadcaster._load_state()["users"] == list(range(120))
+
+    checkpoints = []
+    save_state = broadcaster._save_state
+    def checkpoint(s):
+        save_state(s)
+        checkpoints.append(open(broadcaster.config.BROADCAST_FILE).read())
+    monkeypatch.setattr(broadcaster, "_save_state", checkpoint)
+
+    bot = FloodBot()
+    asyncio.run(broadcaster._run(bot, state))
+    assert bot.sent == 120 + 1  # every user plus the final report
+    assert len(checkpoints) == 3 and len(users_writes) == 1
+    assert all('"users"' not in c for c in checkpoints)
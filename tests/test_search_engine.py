@@ -0,0 +1,39 @@
+import pickle
+
+from modules import search_engine
+
+BOOKS = [
+    {"title": "Sahih Bukhari", "link": "https://t.me/lib/1", "image": ""},
+    {"title": "Riyadus Saliheen", "link": "https://t.me/lib/2", "image": ""},
+    {"title": "Kitab at Tawheed", "link": "https://t.me/lib/3", "image": ""},
+]
+
+def test_typo_candidates_come_from_the_vocabulary():
+    catalog = search_engine.build_index(BOOKS)
+    assert search_engine.typo_candidates("bukhary", catalog)[0] == "bukhari"
+    assert search_engine.typo_candidates("tawhid", catalog)[0] == "tawheed"
+    assert search_engine.typo_candidates("zzzzzzzz", catalog) == []
+
+def test_typo_index_survives_a_snapshot():
+    catalog = pickle.loads(pickle.dumps(search_engine.build_index(BOOKS), protocol=5))
+    for word in catalog.vocab:
+        if len(word) >= search_engine.TYPO_MIN_LEN:
+            assert word in search_engine.typo_candidates(word[:-1] + "q", catalog)
+
+def _use(monkeypatch, books):
+    monkeypatch.setattr(search_engine, "CATALOG", search_engine.build_index(books))
+    monkeypatch.setattr(search_engine, "GENERATION", search_engine.GENERATION + 1)
+
+def test_misspelled_word_is_corrected_before_partial_matches(monkeypatch):
+    # "sharif" alone scores higher on partial_ratio than the book we want
+    distractors = [{"title": f"Sharif {i}", "link": f"https://t.me/lib/s{i}", "image": ""} for i in range(30)]
+    _use(monkeypatch, distractors + [{"title": "Bukhari Sharif", "link": "https://t.me/lib/b", "image": ""}])
+    titles = [book["title"] for book in search_engine.search_book("bukhary sharif")]
+    assert titles[0] == "Bukhari Sharif"
+    assert len(titles) > 1  # the partial matches still follow
+
+def test_inline_completions_rank_above_partial_matches(monkeypatch):
+    distractors = [{"title": f"Sahih {i}", "link": f"https://t.me/lib/s{i}", "image": ""} for i in range(30)]
+    _use(monkeypatch, distractors + BOOKS)
+    first = search_engine.search_inline("sahih bukh")[0]
+    assert search_engine.CATALOG.title(first) == "Sahih Bukhari"
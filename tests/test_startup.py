@@ -0,0 +1,31 @@
+import asyncio
+
+import main
+from modules import ai_brain, config, search_engine, stats
+
+def test_first_download_is_retried_after_local_loading(monkeypatch):
+    outcomes = [False, False, False, True]
+    sleeps = []
+    calls = []
+
+    async def refresh():
+        calls.append("download")
+        return outcomes.pop(0)
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(search_engine, "load_snapshot", lambda: False)
+    monkeypatch.setattr(search_engine, "refresh_database_async", refresh)
+    monkeypatch.setattr(search_engine, "warm_up", lambda: calls.append("numpy"))
+    monkeypatch.setattr(stats, "load", lambda: calls.append("stats"))
+    monkeypatch.setattr(ai_brain, "load_cache", lambda: calls.append("llm cache"))
+    monkeypatch.setattr(ai_brain, "get_client", lambda: calls.append("groq client"))
+    monkeypatch.setattr(main.asyncio, "sleep", sleep)
+    monkeypatch.setattr(config, "DB_RETRY_MAX", 12)
+
+    asyncio.run(main.load_in_background())
+    assert not outcomes
+    assert sleeps == [config.DB_RETRY_MIN, min(config.DB_RETRY_MIN * 2, 12), 12]
+    # GitHub being down must not hold back the local files or the imports
+    assert calls[:4] == ["stats", "llm cache", "groq client", "numpy"]